@@ -8,6 +8,8 @@ import logging
 from pyinjective.async_client import AsyncClient
 from pyinjective.core.network import Network
 
+from src.injective_bot.connection.network_utils import extract_markets
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -29,15 +31,9 @@ async def get_active_markets():
             logger.info(f"Markets response type: {type(markets_response)}")
             logger.info(f"Markets response keys: {list(markets_response.keys()) if hasattr(markets_response, 'keys') else 'No keys'}")
             
-            # Handle different response formats
-            if hasattr(markets_response, 'markets'):
-                markets = markets_response.markets
-            elif isinstance(markets_response, dict) and 'markets' in markets_response:
-                markets = markets_response['markets']
-            elif isinstance(markets_response, list):
-                markets = markets_response
-            else:
-                logger.error(f"Unknown markets response format: {type(markets_response)}")
+            markets = extract_markets(markets_response)
+            if not markets:
+                logger.error(f"No markets found in response format: {type(markets_response)}")
                 continue
             
             logger.info(f"Found {len(markets)} spot markets on {network_name}")
@@ -81,10 +77,11 @@ async def get_active_markets():
                 logger.info(f"Waiting 10 seconds for data on {test_market['ticker']}...")
                 await asyncio.sleep(10)
                 
+                # Shield so a stream that ignores cancellation can't stall the timeout
                 task.cancel()
                 try:
-                    await task
-                except asyncio.CancelledError:
+                    await asyncio.wait_for(asyncio.shield(task), timeout=2.0)
+                except (asyncio.CancelledError, asyncio.TimeoutError):
                     pass
                 
                 logger.info(f"Result: {callback_count} callbacks received")
@@ -4,44 +4,86 @@ Debug the actual API calls and responses to understand the multiple market issue
 """
 
 import asyncio
+import atexit
 import logging
-from datetime import datetime, timezone
-from typing import List
+import logging.handlers
+import queue
+from collections import deque
+from typing import FrozenSet
 
 from src.injective_bot.connection import ConnectionState, MessageType, WebSocketMessage, MessageHandler
 from src.injective_bot.connection.injective_client import InjectiveStreamClient
 from src.injective_bot.config import WebSocketConfig
+from debug_markets import BTC_USDT, INJ_USDT
 
-# Set up detailed logging
+# Set up detailed logging - records are written by a background listener thread
+_log_queue = queue.Queue()
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
 logging.basicConfig(
     level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(message)s',
+    handlers=[logging.handlers.QueueHandler(_log_queue)],
+    force=True  # replace any root handler installed by imported libraries
 )
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
-# Also enable injective-py logging
-logging.getLogger('pyinjective').setLevel(logging.DEBUG)
+# Only recent messages are kept; counters cover the full run
+MESSAGE_BUFFER_SIZE = 4096
+
+# Each phase ends once this many messages arrived, or after its timeout
+MESSAGE_TARGET = 50
+
+# Message types the collector subscribes to - shared, immutable
+_SUPPORTED = frozenset({MessageType.ORDERBOOK, MessageType.TRADES, MessageType.MARKET_DATA})
 
 class DetailedCollector(MessageHandler):
-    def __init__(self):
-        self.messages = []
+    __slots__ = ('messages', '_count', 'markets_seen', '_done', '_target')
+    
+    def __init__(self, target: int = MESSAGE_TARGET):
+        self.messages = deque(maxlen=MESSAGE_BUFFER_SIZE)
+        self._count = 0
         self.markets_seen = set()
-        self.start_time = None
+        self._done = asyncio.Event()
+        self._target = target
+    
+    def reset(self) -> None:
+        """Clear collected messages before the next test phase"""
+        self.messages.clear()
+        self._count = 0
+        self.markets_seen.clear()
+        self._done.clear()
+    
+    async def wait_until_done(self, timeout: float) -> None:
+        """Wait until the message target is reached or the timeout elapses"""
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
         
-    def get_supported_message_types(self) -> List[MessageType]:
-        return [MessageType.ORDERBOOK, MessageType.TRADES, MessageType.MARKET_DATA]
+    def get_supported_message_types(self) -> FrozenSet[MessageType]:
+        return _SUPPORTED
+    
+    on_message_sync = True
     
     async def handle_message(self, message: WebSocketMessage) -> None:
-        if self.start_time is None:
-            self.start_time = datetime.now(timezone.utc)
+        self.on_message(message)
+    
+    def on_message(self, message: WebSocketMessage) -> None:
+        mid = message.market_id
         self.messages.append(message)
-        if message.market_id:
-            self.markets_seen.add(message.market_id)
-        logger.info(f"📨 Message #{len(self.messages)}: {message.message_type.value} for {message.market_id}")
+        count = self._count = self._count + 1
+        if count >= self._target:
+            self._done.set()
+        if mid:
+            self.markets_seen.add(mid)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("📨 Message #%d: %s for %s", count, message.message_type.value, mid)
         
         # Log a sample of the data structure
-        if len(self.messages) <= 3:
-            logger.debug(f"Message data keys: {list(message.data.keys()) if hasattr(message.data, 'keys') else 'Not a dict'}")
+        if count <= 3 and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Message data keys: %s", list(message.data.keys()) if hasattr(message.data, 'keys') else 'Not a dict')
 
 async def debug_api_calls():
     """Debug the actual API calls to understand what's happening"""
@@ -49,11 +91,8 @@ async def debug_api_calls():
     config = WebSocketConfig(connection_timeout=30.0)
     
     # Start with just 1 market to establish baseline
-    single_market = ["0x0511ddc4e6586f3bfe1acb2dd905f8b8a82c97e1edaef654b12ca7e6031ca0fa"]
-    two_markets = [
-        "0x0511ddc4e6586f3bfe1acb2dd905f8b8a82c97e1edaef654b12ca7e6031ca0fa",
-        "0x4ca0f92fc28be0c9761326016b5a1a2177dd6375558365116b5bdda9abc229ce"
-    ]
+    single_market = [INJ_USDT]
+    two_markets = [INJ_USDT, BTC_USDT]
     
     logger.info("=== TESTING SINGLE MARKET FIRST ===")
     
@@ -75,10 +114,10 @@ async def debug_api_calls():
         logger.info("📊 Testing single market orderbook subscription...")
         await client.subscribe_spot_orderbook_updates(single_market)
         
-        logger.info("⏰ Waiting 10 seconds for single market data...")
-        await asyncio.sleep(10)
+        logger.info(f"⏰ Waiting up to 10 seconds or {MESSAGE_TARGET} messages for single market data...")
+        await collector.wait_until_done(timeout=10.0)
         
-        single_market_messages = len(collector.messages)
+        single_market_messages = collector._count
         logger.info(f"Single market result: {single_market_messages} messages")
         
         if single_market_messages == 0:
@@ -86,18 +125,17 @@ async def debug_api_calls():
             return
         
         # Reset collector
-        collector.messages.clear()
-        collector.markets_seen.clear()
+        collector.reset()
         
         # Now test two markets
         logger.info("\n=== TESTING TWO MARKETS ===")
         logger.info("📊 Testing two market orderbook subscription...")
         await client.subscribe_spot_orderbook_updates(two_markets)
         
-        logger.info("⏰ Waiting 15 seconds for two market data...")
-        await asyncio.sleep(15)
+        logger.info(f"⏰ Waiting up to 15 seconds or {MESSAGE_TARGET} messages for two market data...")
+        await collector.wait_until_done(timeout=15.0)
         
-        two_market_messages = len(collector.messages)
+        two_market_messages = collector._count
         markets_with_data = len(collector.markets_seen)
         
         logger.info(f"Two market result: {two_market_messages} messages from {markets_with_data} markets")
@@ -4,14 +4,39 @@ Simple script to understand the Injective API response format
 """
 
 import asyncio
+import dataclasses
 import logging
 import json
+from typing import Any, Dict, Tuple
 from pyinjective.async_client import AsyncClient
 from pyinjective.core.network import Network
 
+from src.injective_bot.connection.network_utils import extract_markets
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Field names per dataclass/protobuf type - their schema is fixed, so reflect once
+_FIELDS_CACHE: Dict[type, Tuple[str, ...]] = {}
+
+def _field_names(obj: Any) -> Tuple[str, ...]:
+    """Field names of a dataclass, protobuf message, dict or plain object"""
+    if isinstance(obj, dict):
+        return tuple(obj)
+    obj_type = type(obj)
+    names = _FIELDS_CACHE.get(obj_type)
+    if names is not None:
+        return names
+    if dataclasses.is_dataclass(obj):
+        names = tuple(f.name for f in dataclasses.fields(obj))
+    elif hasattr(obj_type, 'DESCRIPTOR'):
+        names = tuple(f.name for f in obj_type.DESCRIPTOR.fields)
+    else:
+        # Plain objects may carry different attributes per instance - don't cache
+        return tuple(getattr(obj, '__dict__', ()))
+    _FIELDS_CACHE[obj_type] = names
+    return names
+
 async def inspect_api_response():
     """Inspect the actual API response format"""
     try:
@@ -23,36 +48,23 @@ async def inspect_api_response():
         
         logger.info(f"Response type: {type(markets_response)}")
         
-        if hasattr(markets_response, '__dict__'):
-            logger.info(f"Response attributes: {list(markets_response.__dict__.keys())}")
+        logger.info(f"Response fields: {list(_field_names(markets_response))}")
             
         if isinstance(markets_response, dict):
-            logger.info(f"Response keys: {list(markets_response.keys())}")
             for key, value in list(markets_response.items())[:3]:  # Show first 3 items
                 logger.info(f"  {key}: {type(value)} - {str(value)[:100]}...")
         
-        # Try to extract markets in different ways
-        possible_markets = None
-        if hasattr(markets_response, 'markets'):
-            possible_markets = markets_response.markets
-            logger.info(f"Found markets attribute: {type(possible_markets)}")
-        elif isinstance(markets_response, dict):
-            for key in ['markets', 'market', 'data', 'result']:
-                if key in markets_response:
-                    possible_markets = markets_response[key]
-                    logger.info(f"Found markets in key '{key}': {type(possible_markets)}")
-                    break
+        possible_markets = extract_markets(markets_response)
+        logger.info(f"Extracted markets: {type(possible_markets)}")
         
         if possible_markets:
             logger.info(f"Markets type: {type(possible_markets)}")
-            if isinstance(possible_markets, list) and len(possible_markets) > 0:
-                first_market = possible_markets[0]
-                logger.info(f"First market type: {type(first_market)}")
-                if hasattr(first_market, '__dict__'):
-                    logger.info(f"First market attributes: {list(first_market.__dict__.keys())}")
-                elif isinstance(first_market, dict):
-                    logger.info(f"First market keys: {list(first_market.keys())}")
-                    logger.info(f"Sample market: {json.dumps(first_market, indent=2, default=str)[:500]}...")
+            # Protobuf repeated fields are sequences but not lists
+            first_market = possible_markets[0]
+            logger.info(f"First market type: {type(first_market)}")
+            logger.info(f"First market fields: {list(_field_names(first_market))}")
+            if isinstance(first_market, dict):
+                logger.info(f"Sample market: {json.dumps(first_market, indent=2, default=str)[:500]}...")
         else:
             logger.warning("Could not find markets in response")
             
@@ -5,30 +5,60 @@ Test our InjectiveStreamClient with debugging to find the callback issue
 
 import asyncio
 import logging
+import traceback
+from collections import deque
+from itertools import islice
 from datetime import datetime, timezone
 from typing import List
 
-from injective_bot.connection import ConnectionState, MessageType, WebSocketMessage, MessageHandler
+from injective_bot.connection import ConnectionState, WebSocketMessage
 from injective_bot.connection.injective_client import InjectiveStreamClient
 from injective_bot.config import WebSocketConfig
+from injective_bot.connection.network_utils import run
+from debug_markets import CallbackCounter, INJ_USDT, MESSAGE_HISTORY, QueuedCollector, disconnect_bounded
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class DebugMessageCollector(MessageHandler):
+# Handler messages after which the test stops waiting
+MESSAGE_TARGET = 50
+
+class DebugMessageCollector(QueuedCollector):
     """Debug message collector with detailed logging"""
     
+    __slots__ = ('messages', 'callback_count', '_done')
+    
     def __init__(self):
-        self.messages = []
+        super().__init__()
+        self.messages = deque(maxlen=MESSAGE_HISTORY)
         self.callback_count = 0
-        
-    def get_supported_message_types(self) -> List[MessageType]:
-        return [MessageType.ORDERBOOK, MessageType.TRADES, MessageType.MARKET_DATA]
+        self._done = asyncio.Event()
     
-    async def handle_message(self, message: WebSocketMessage) -> None:
-        self.callback_count += 1
-        self.messages.append(message)
-        logger.info(f"🎉 HANDLER RECEIVED MESSAGE #{self.callback_count}: {message.message_type.value} for {message.market_id}")
+    async def wait_until_done(self, timeout: float) -> bool:
+        """Wait until MESSAGE_TARGET messages were handled or timeout elapses"""
+        try:
+            await asyncio.wait_for(self._done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+    
+    def _process_batch(self, batch: List[WebSocketMessage]) -> None:
+        log_each = logger.isEnabledFor(logging.INFO)
+        for message in batch:
+            self.callback_count += 1
+            self.messages.append(message)
+            if log_each:
+                logger.info("🎉 HANDLER RECEIVED MESSAGE #%d: %s for %s", self.callback_count,
+                            message.message_type.value, message.market_id)
+        if self.callback_count >= MESSAGE_TARGET:
+            self._done.set()
+
+class DebugInjectiveStreamClient(InjectiveStreamClient):
+    """Stream client that logs subscription requests"""
+    
+    async def subscribe_spot_orderbook_updates(self, market_ids: List[str]) -> None:
+        logger.info(f"🎯 DEBUG: Subscribing to {market_ids}")
+        await super().subscribe_spot_orderbook_updates(market_ids)
 
 async def test_debug_injective_client():
     """Test with detailed debugging"""
@@ -40,7 +70,7 @@ async def test_debug_injective_client():
         connection_timeout=30.0
     )
     
-    client = InjectiveStreamClient(config=config, network="mainnet")
+    client = DebugInjectiveStreamClient(config=config, network="mainnet")
     collector = DebugMessageCollector()
     
     try:
@@ -57,21 +87,23 @@ async def test_debug_injective_client():
             return 0
             
         logger.info("✅ Connected successfully")
+        collector.start()
         
         # Add debug patch to the client to see callback activity
         original_callback = None
-        callback_count = 0
+        raw_callbacks = CallbackCounter()
         
         def debug_callback_wrapper(original_callback_func):
             def wrapped_callback(data):
-                nonlocal callback_count
-                callback_count += 1
-                logger.info(f"🔥 RAW CALLBACK #{callback_count}: {type(data)} - {list(data.keys()) if hasattr(data, 'keys') else 'no keys'}")
+                raw_callbacks.count += 1
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("🔥 RAW CALLBACK #%d: %s - %s", raw_callbacks.count, type(data).__name__,
+                                 list(islice(data, 5)) if hasattr(data, 'keys') else 'no keys')
                 
                 # Call original callback
                 try:
                     result = original_callback_func(data)
-                    logger.info(f"✅ Original callback executed successfully")
+                    logger.debug("✅ Original callback executed successfully")
                     return result
                 except Exception as e:
                     logger.error(f"❌ Error in original callback: {e}")
@@ -79,48 +111,38 @@ async def test_debug_injective_client():
                     
             return wrapped_callback
         
-        # Patch the subscription method to wrap callbacks
-        original_subscribe = client.subscribe_spot_orderbook_updates
-        
-        async def debug_subscribe(market_ids):
-            logger.info(f"🎯 DEBUG: Subscribing to {market_ids}")
-            return await original_subscribe(market_ids)
-        
-        client.subscribe_spot_orderbook_updates = debug_subscribe
-        
         # Subscribe to markets
-        market_ids = ["0x0511ddc4e6586f3bfe1acb2dd905f8b8a82c97e1edaef654b12ca7e6031ca0fa"]
+        market_ids = [INJ_USDT]
         logger.info(f"📡 Subscribing to markets: {market_ids}")
         
         await client.subscribe_spot_orderbook_updates(market_ids)
         
         # Wait and monitor
-        logger.info("⏰ Waiting 15 seconds for messages...")
+        logger.info(f"⏰ Waiting up to 15 seconds for {MESSAGE_TARGET} messages...")
         
-        for i in range(15):
-            await asyncio.sleep(1)
-            logger.info(f"⏳ {i+1}s - Callbacks: {callback_count}, Handler messages: {collector.callback_count}")
+        reached = await collector.wait_until_done(15.0)
             
-        logger.info("🏁 Test complete")
+        logger.info("🏁 Test complete" if reached else "🏁 Test complete (timed out)")
         
         # Results
         logger.info(f"📊 RESULTS:")
-        logger.info(f"  Raw callbacks received: {callback_count}")
+        logger.info(f"  Raw callbacks received: {raw_callbacks.count}")
         logger.info(f"  Handler messages received: {collector.callback_count}")
+        logger.info(f"  Messages dropped (queue full): {collector.dropped}")
         logger.info(f"  Connection state: {client.get_connection_state()}")
         
         return collector.callback_count
         
     except Exception as e:
         logger.error(f"❌ Test error: {e}")
-        import traceback
         logger.error(traceback.format_exc())
         return 0
         
     finally:
+        await collector.stop()
         if client.get_connection_state() == ConnectionState.CONNECTED:
-            await client.disconnect()
+            await disconnect_bounded(client)
 
 if __name__ == "__main__":
-    result = asyncio.run(test_debug_injective_client())
+    result = run(test_debug_injective_client())
     print(f"\nFinal handler message count: {result}")
@@ -5,103 +5,132 @@ Detailed debug to understand subscription behavior
 
 import asyncio
 import logging
+from itertools import islice
 import time
+from collections import deque
 from datetime import datetime, timezone
-from typing import List
+from typing import Iterable, List, Set
 
-from injective_bot.connection import ConnectionState, MessageType, WebSocketMessage, MessageHandler
+from injective_bot.connection import ConnectionState, WebSocketMessage
 from injective_bot.connection.injective_client import InjectiveStreamClient
 from injective_bot.config import WebSocketConfig
+from injective_bot.connection.network_utils import run
+from debug_markets import BTC_USDT, INJ_USDT, MESSAGE_HISTORY, QueuedCollector, disconnect_bounded
 
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    force=True  # replace any root handler installed by imported libraries
+)
+# Library-internal chatter would dominate the output and cost formatting per message
+logging.getLogger('pyinjective').setLevel(logging.WARNING)
+logging.getLogger('grpc').setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
-class DetailedCollector(MessageHandler):
+class DetailedCollector(QueuedCollector):
     def __init__(self, name):
+        super().__init__()
         self.name = name
-        self.messages = []
+        self.messages = deque(maxlen=MESSAGE_HISTORY)
+        self.message_count = 0
+        self.markets_seen: Set[str] = set()
         self.start_time = None
-        
-    def get_supported_message_types(self) -> List[MessageType]:
-        return [MessageType.ORDERBOOK, MessageType.TRADES, MessageType.MARKET_DATA]
     
-    async def handle_message(self, message: WebSocketMessage) -> None:
+    def _process_batch(self, batch: List[WebSocketMessage]) -> None:
         if self.start_time is None:
             self.start_time = datetime.now(timezone.utc)
-        self.messages.append(message)
-        logger.info(f"[{self.name}] Message #{len(self.messages)}: {message.message_type.value} for {message.market_id}")
-        logger.debug(f"[{self.name}] Data keys: {list(message.data.keys()) if hasattr(message.data, 'keys') else 'No keys'}")
+        self.messages.extend(batch)
+        self.message_count += len(batch)
+        markets_seen = self.markets_seen
+        for message in batch:
+            if message.market_id:
+                markets_seen.add(message.market_id)
+        if logger.isEnabledFor(logging.DEBUG):
+            for message in batch:
+                logger.debug("[%s] Data keys: %s", self.name,
+                             list(islice(message.data, 5)) if hasattr(message.data, 'keys') else 'No keys')
+        if logger.isEnabledFor(logging.INFO):
+            last = batch[-1]
+            logger.info("[%s] Processed %d messages (total %d), last: %s for %s", self.name, len(batch),
+                        self.message_count, last.message_type.value, last.market_id)
 
-async def detailed_debug():
-    """Detailed debugging with step-by-step analysis"""
-    
-    config = WebSocketConfig(connection_timeout=30.0)
-    btc_usdt = "0x0511ddc4e6586f3bfe1acb2dd905f8b8a82c97e1edaef654b12ca7e6031ca0fa"
-    eth_usdt = "0x4ca0f92fc28be0c9761326016b5a1a2177dd6375558365116b5bdda9abc229ce"
-    
-    print("\n" + "="*60)
-    print("DETAILED SUBSCRIPTION DEBUG")
-    print("="*60)
-    
-    # Test 1: Single Market Orderbook (Known working)
-    print("\n🧪 TEST 1: Single Market Orderbook (Reference)")
+async def subscribe_orderbook_once(client: InjectiveStreamClient, subscribed: Set[str], market_ids: Iterable[str]) -> List[str]:
+    """Subscribe to the orderbooks of market_ids not already streamed on this client"""
+    new = [market_id for market_id in dict.fromkeys(market_ids) if market_id not in subscribed]
+    if new:
+        subscribed.update(new)
+        await client.subscribe_spot_orderbook_updates(new)
+    return new
+
+async def test_single_orderbook(config: WebSocketConfig, inj_usdt: str) -> str:
+    """Test 1: Single Market Orderbook (Known working)"""
+    report = ["\n🧪 TEST 1: Single Market Orderbook (Reference)"]
     client1 = InjectiveStreamClient(config=config, network="mainnet")
     collector1 = DetailedCollector("SingleOrderbook")
     client1.register_handler(collector1)
     
     try:
         await client1.connect()
+        collector1.start()
         logger.info("Connected for single orderbook test")
         
-        await client1.subscribe_spot_orderbook_updates([btc_usdt])
+        await client1.subscribe_spot_orderbook_updates([inj_usdt])
         logger.info("Subscribed to single market orderbook")
         
         await asyncio.sleep(8)
-        print(f"✅ Result: {len(collector1.messages)} messages")
+        report.append(f"✅ Result: {collector1.message_count} messages")
         
     except Exception as e:
-        print(f"❌ Error: {e}")
+        report.append(f"❌ Error: {e}")
     finally:
+        await collector1.stop()
         if client1.get_connection_state() == ConnectionState.CONNECTED:
-            await client1.disconnect()
-    
-    # Test 2: Single Market Trades (Should work now)
-    print("\n🧪 TEST 2: Single Market Trades")
+            await disconnect_bounded(client1)
+    return "\n".join(report)
+
+async def test_single_trades(config: WebSocketConfig, inj_usdt: str) -> str:
+    """Test 2: Single Market Trades (Should work now)"""
+    report = ["\n🧪 TEST 2: Single Market Trades"]
     client2 = InjectiveStreamClient(config=config, network="mainnet")
     collector2 = DetailedCollector("SingleTrades")
     client2.register_handler(collector2)
     
     try:
         await client2.connect()
+        collector2.start()
         logger.info("Connected for single trades test")
         
-        await client2.subscribe_spot_trades_updates([btc_usdt])
+        await client2.subscribe_spot_trades_updates([inj_usdt])
         logger.info("Subscribed to single market trades")
         
         await asyncio.sleep(8)
-        print(f"📊 Result: {len(collector2.messages)} messages")
+        report.append(f"📊 Result: {collector2.message_count} messages")
         
     except Exception as e:
-        print(f"❌ Error: {e}")
+        report.append(f"❌ Error: {e}")
     finally:
+        await collector2.stop()
         if client2.get_connection_state() == ConnectionState.CONNECTED:
-            await client2.disconnect()
-    
-    # Test 3: Two Markets Orderbook (Problematic)
-    print("\n🧪 TEST 3: Two Markets Orderbook")
+            await disconnect_bounded(client2)
+    return "\n".join(report)
+
+async def test_multi_orderbook(config: WebSocketConfig, inj_usdt: str, btc_usdt: str) -> str:
+    """Test 3: Two Markets Orderbook (Problematic)"""
+    report = ["\n🧪 TEST 3: Two Markets Orderbook"]
     client3 = InjectiveStreamClient(config=config, network="mainnet")
     collector3 = DetailedCollector("MultiOrderbook")
     client3.register_handler(collector3)
     
     try:
         await client3.connect()
+        collector3.start()
         logger.info("Connected for multi orderbook test")
         
         # Check subscription tasks before
         logger.info(f"Active subscriptions before: {len(client3._active_subscriptions)}")
         logger.info(f"Subscription tasks before: {len(client3._subscription_tasks)}")
         
-        await client3.subscribe_spot_orderbook_updates([btc_usdt, eth_usdt])
+        await client3.subscribe_spot_orderbook_updates([inj_usdt, btc_usdt])
         logger.info("Subscribed to two markets orderbook")
         
         # Check subscription tasks after
@@ -110,9 +139,9 @@ async def detailed_debug():
         logger.info(f"Subscription IDs: {list(client3._active_subscriptions)}")
         
         await asyncio.sleep(8)
-        print(f"📊 Result: {len(collector3.messages)} messages")
+        report.append(f"📊 Result: {collector3.message_count} messages")
         
-        if len(collector3.messages) == 0:
+        if collector3.message_count == 0:
             logger.warning("No messages received - checking subscription task status")
             for sub_id, task in client3._subscription_tasks.items():
                 logger.info(f"Task {sub_id}: done={task.done()}, cancelled={task.cancelled()}")
@@ -124,46 +153,70 @@ async def detailed_debug():
                         logger.error(f"Task {sub_id} exception: {task_e}")
         
     except Exception as e:
-        print(f"❌ Error: {e}")
+        report.append(f"❌ Error: {e}")
         logger.exception("Full error details:")
     finally:
+        await collector3.stop()
         if client3.get_connection_state() == ConnectionState.CONNECTED:
-            await client3.disconnect()
-    
-    # Test 4: Sequential single market subscriptions 
-    print("\n🧪 TEST 4: Sequential Single Market Subscriptions")
+            await disconnect_bounded(client3)
+    return "\n".join(report)
+
+async def test_sequential_orderbook(config: WebSocketConfig, inj_usdt: str, btc_usdt: str) -> str:
+    """Test 4: Sequential single market subscriptions"""
+    report = ["\n🧪 TEST 4: Sequential Single Market Subscriptions"]
     client4 = InjectiveStreamClient(config=config, network="mainnet")
     collector4 = DetailedCollector("Sequential")
     client4.register_handler(collector4)
     
     try:
         await client4.connect()
+        collector4.start()
         logger.info("Connected for sequential test")
         
         # Subscribe to first market
-        await client4.subscribe_spot_orderbook_updates([btc_usdt])
-        logger.info("Subscribed to BTC-USDT")
+        subscribed4: Set[str] = set()
+        await subscribe_orderbook_once(client4, subscribed4, [inj_usdt])
+        logger.info("Subscribed to INJ-USDT")
         await asyncio.sleep(3)
         
         # Subscribe to second market  
-        await client4.subscribe_spot_orderbook_updates([eth_usdt])
-        logger.info("Subscribed to ETH-USDT")
+        await subscribe_orderbook_once(client4, subscribed4, [btc_usdt])
+        logger.info("Subscribed to BTC-USDT")
         await asyncio.sleep(5)
         
-        print(f"📊 Result: {len(collector4.messages)} messages")
+        report.append(f"📊 Result: {collector4.message_count} messages")
         
         # Check which markets we got data from
-        markets_seen = set()
-        for msg in collector4.messages:
-            if msg.market_id:
-                markets_seen.add(msg.market_id)
-        logger.info(f"Markets with data: {markets_seen}")
+        logger.info(f"Markets with data: {collector4.markets_seen}")
         
     except Exception as e:
-        print(f"❌ Error: {e}")
+        report.append(f"❌ Error: {e}")
     finally:
+        await collector4.stop()
         if client4.get_connection_state() == ConnectionState.CONNECTED:
-            await client4.disconnect()
+            await disconnect_bounded(client4)
+    return "\n".join(report)
+
+async def detailed_debug():
+    """Detailed debugging with step-by-step analysis"""
+    
+    config = WebSocketConfig(connection_timeout=30.0)
+    
+    print("\n" + "="*60)
+    print("DETAILED SUBSCRIPTION DEBUG")
+    print("="*60)
+    
+    # The tests use independent clients, so run them side by side; each
+    # report is printed whole once every test has finished
+    results = await asyncio.gather(
+        test_single_orderbook(config, INJ_USDT),
+        test_single_trades(config, INJ_USDT),
+        test_multi_orderbook(config, INJ_USDT, BTC_USDT),
+        test_sequential_orderbook(config, INJ_USDT, BTC_USDT),
+        return_exceptions=True
+    )
+    for result in results:
+        print(result if isinstance(result, str) else f"\n❌ Error: {result}")
 
 if __name__ == "__main__":
-    asyncio.run(detailed_debug())
+    run(detailed_debug())
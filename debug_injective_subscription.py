@@ -6,96 +6,127 @@ This will help us understand why callbacks aren't being triggered
 
 import asyncio
 import logging
+from itertools import islice
+from collections import Counter
+from typing import Awaitable, Callable, List, Tuple
 from pyinjective.async_client import AsyncClient
 from pyinjective.core.network import Network
+from debug_markets import BTC_USDT, CallbackCounter, INJ_USDT
+from src.injective_bot.connection.network_utils import run
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Network configs built once per run
+MAINNET = Network.mainnet()
+TESTNET = Network.testnet()
+
+async def _listen(network_name: str, stream: str, listen: Callable[..., Awaitable[None]], **kwargs) -> None:
+    """Run one stream listener, logging its failure so the other stream keeps running"""
+    try:
+        await listen(**kwargs)
+    except Exception as e:
+        logger.error("[%s] %s stream failed: %s", network_name, stream, e)
+
+async def probe_network(network_name: str, network: Network, market_ids: List[str]) -> Tuple[str, int, int]:
+    """Stream orderbook and trades on one network and return (name, orderbook updates, trades)"""
+    logger.info(f"\n=== Testing {network_name.upper()} ===")
+    
+    # Callback counters, reported even if the probe fails part way
+    orderbook_counter = CallbackCounter()
+    trades_counter = CallbackCounter()
+    
+    try:
+        # Create AsyncClient
+        client = AsyncClient(network)
+        
+        orderbook_markets = Counter()
+        trade_markets = Counter()
+        
+        def orderbook_callback(data):
+            orderbook_counter.count += 1
+            is_dict = isinstance(data, dict)
+            if is_dict and 'orderbook' in data:
+                orderbook_markets[data.get('market_id', 'unknown')] += 1
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("[%s] Orderbook callback #%d: %s - %s", network_name, orderbook_counter.count, type(data).__name__,
+                            list(islice(data, 5)) if is_dict else 'non-dict data')
+        
+        def trades_callback(data):
+            trades_counter.count += 1
+            is_dict = isinstance(data, dict)
+            if is_dict and 'trade' in data:
+                trade_markets[data.get('market_id', 'unknown')] += 1
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("[%s] Trades callback #%d: %s - %s", network_name, trades_counter.count, type(data).__name__,
+                            list(islice(data, 5)) if is_dict else 'non-dict data')
+        
+        logger.info(f"[{network_name}] Starting subscriptions for markets: {market_ids}")
+        
+        # Both listeners share one structured lifetime; the timeout cancels them
+        # together and is the normal end of the test. Each listener handles its
+        # own failure, so one broken stream does not cancel the other
+        logger.info(f"[{network_name}] Waiting for 15 seconds...")
+        try:
+            async with asyncio.timeout(15):
+                async with asyncio.TaskGroup() as tg:
+                    tg.create_task(_listen(
+                        network_name, "Orderbook", client.listen_spot_orderbook_updates,
+                        market_ids=market_ids, callback=orderbook_callback
+                    ))
+                    tg.create_task(_listen(
+                        network_name, "Trades", client.listen_spot_trades_updates,
+                        market_ids=market_ids, callback=trades_callback
+                    ))
+        except TimeoutError:
+            pass
+        
+        orderbook_count, trades_count = orderbook_counter.count, trades_counter.count
+        logger.info(f"[{network_name}] Results: {orderbook_count} orderbook updates, {trades_count} trades")
+        logger.info(f"[{network_name}] Orderbook markets: {dict(orderbook_markets)}, trade markets: {dict(trade_markets)}")
+        
+        if orderbook_count > 0 or trades_count > 0:
+            logger.info(f"[{network_name}] SUCCESS! Received data from {network_name}")
+        else:
+            logger.warning(f"[{network_name}] No data received from {network_name}")
+        return network_name, orderbook_count, trades_count
+    
+    except Exception as e:
+        logger.error(f"[{network_name}] Error testing {network_name}: {e}")
+        return network_name, orderbook_counter.count, trades_counter.count
+
 async def test_direct_injective_subscription():
     """Test direct injective-py subscription to understand callback behavior"""
     
     # Try both testnet and mainnet
     networks = [
-        ("mainnet", Network.mainnet(), [
-            "0x0511ddc4e6586f3bfe1acb2dd905f8b8a82c97e1edaef654b12ca7e6031ca0fa",  # INJ/USDT mainnet
-            "0x4ca0f92fc28be0c9761326016b5a1a2177dd6375558365116b5bdda9abc229ce",  # BTC/USDT mainnet
+        ("mainnet", MAINNET, [
+            INJ_USDT,
+            BTC_USDT,
         ]),
-        ("testnet", Network.testnet(), [
+        ("testnet", TESTNET, [
             "0x54d4505adef6a5cef26bc403a33d595620ded4e15b9e2bc3dd489b714813366a",  # INJ/USDT testnet
         ])
     ]
     
-    for network_name, network, market_ids in networks:
-        logger.info(f"\n=== Testing {network_name.upper()} ===")
-        
-        try:
-            # Create AsyncClient
-            client = AsyncClient(network)
-            
-            # Callback counters
-            orderbook_count = 0
-            trades_count = 0
-            
-            def orderbook_callback(data):
-                nonlocal orderbook_count
-                orderbook_count += 1
-                logger.info(f"[{network_name}] Orderbook callback #{orderbook_count}: {type(data)} - {list(data.keys()) if hasattr(data, 'keys') else 'non-dict data'}")
-                if hasattr(data, 'keys') and 'orderbook' in data:
-                    logger.info(f"[{network_name}] Orderbook market: {data.get('market_id', 'unknown')}")
-            
-            def trades_callback(data):
-                nonlocal trades_count
-                trades_count += 1
-                logger.info(f"[{network_name}] Trades callback #{trades_count}: {type(data)} - {list(data.keys()) if hasattr(data, 'keys') else 'non-dict data'}")
-                if hasattr(data, 'keys') and 'trade' in data:
-                    logger.info(f"[{network_name}] Trade market: {data.get('market_id', 'unknown')}")
-            
-            logger.info(f"[{network_name}] Starting subscriptions for markets: {market_ids}")
-            
-            # Start subscriptions as background tasks
-            orderbook_task = asyncio.create_task(
-                client.listen_spot_orderbook_updates(
-                    market_ids=market_ids,
-                    callback=orderbook_callback
-                )
-            )
-            
-            trades_task = asyncio.create_task(
-                client.listen_spot_trades_updates(
-                    market_ids=market_ids,
-                    callback=trades_callback
-                )
-            )
-            
-            # Wait for data for 15 seconds
-            logger.info(f"[{network_name}] Waiting for 15 seconds...")
-            await asyncio.sleep(15)
-            
-            # Cancel subscriptions
-            orderbook_task.cancel()
-            trades_task.cancel()
-            
-            try:
-                await asyncio.gather(orderbook_task, trades_task, return_exceptions=True)
-            except:
-                pass
-            
-            logger.info(f"[{network_name}] Results: {orderbook_count} orderbook updates, {trades_count} trades")
-            
-            # If we got data on this network, we're done
-            if orderbook_count > 0 or trades_count > 0:
-                logger.info(f"[{network_name}] SUCCESS! Received data from {network_name}")
-                return network_name, orderbook_count, trades_count
-            else:
-                logger.warning(f"[{network_name}] No data received from {network_name}")
-                
-        except Exception as e:
-            logger.error(f"[{network_name}] Error testing {network_name}: {e}")
+    # Each network gets its own client, so the probes overlap their waits
+    results = await asyncio.gather(
+        *(probe_network(network_name, network, market_ids) for network_name, network, market_ids in networks),
+        return_exceptions=True
+    )
+    
+    # First network (in the order above) that delivered data wins
+    for result in results:
+        if isinstance(result, BaseException):
+            logger.error(f"Network probe failed: {result}")
+            continue
+        network_name, orderbook_count, trades_count = result
+        if orderbook_count > 0 or trades_count > 0:
+            return network_name, orderbook_count, trades_count
             
     return None, 0, 0
 
 if __name__ == "__main__":
-    result = asyncio.run(test_direct_injective_subscription())
+    result = run(test_direct_injective_subscription())
     print(f"\nFinal result: {result}")
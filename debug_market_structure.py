@@ -4,15 +4,22 @@ Quick debug script to see market data structure
 """
 import asyncio
 import logging
+import re
 from pyinjective.async_client import AsyncClient
 from pyinjective.core.network import Network
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Network config built once per run
+MAINNET = Network.mainnet()
+
+# USD-quoted quote denoms: "USD" as written, or usdt/usdc in any case
+QUOTE_USD_RE = re.compile(r'USD|(?i:usd[tc])')
+
 async def debug_markets():
     """Debug market data structure"""
-    client = AsyncClient(Network.mainnet())
+    client = AsyncClient(MAINNET)
     
     try:
         # Fetch markets
@@ -51,7 +58,7 @@ async def debug_markets():
             usd_count = 0
             sample_usd_markets = []
             
-            for market in markets[:50]:  # Check first 50
+            for market in markets:
                 try:
                     if isinstance(market, dict):
                         ticker = market.get('ticker', '')
@@ -59,9 +66,8 @@ async def debug_markets():
                         base_denom = market.get('baseDenom', '')
                         market_id = market.get('marketId', '')  # Note: camelCase
                         
-                        # Check for USD in various fields
-                        if ('USD' in ticker or 'USD' in quote_denom or 
-                            'usdt' in quote_denom.lower() or 'usdc' in quote_denom.lower()):
+                        # Check for USD in the ticker (case-sensitive) and the quote denom
+                        if 'USD' in ticker or QUOTE_USD_RE.search(quote_denom):
                             usd_count += 1
                             if len(sample_usd_markets) < 10:
                                 display_ticker = ticker if ticker else f"{base_denom}/{quote_denom}"
@@ -81,7 +87,7 @@ async def debug_markets():
                 except Exception as e:
                     print(f"Error processing market: {e}")
                     
-            print(f"\nFound {usd_count} USD-like markets in first 50 checked")
+            print(f"\nFound {usd_count} USD-like markets out of {len(markets)}")
             print("Sample USD markets:")
             for market in sample_usd_markets:
                 print(f"  {market['ticker']} - {market['id']}")
@@ -92,8 +98,7 @@ async def debug_markets():
         
     except Exception as e:
         print(f"Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("debug_markets failed")
         return []
 
 if __name__ == "__main__":
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Mainnet spot market IDs, the queued collector base and teardown helpers shared by the debug scripts
+"""
+
+import asyncio
+import logging
+import sys
+from abc import abstractmethod
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, FrozenSet, List, Optional
+
+try:
+    from injective_bot.connection import MessageHandler, MessageType, WebSocketMessage
+except ImportError:  # run without src/ on sys.path, as the src.injective_bot-importing scripts are
+    from src.injective_bot.connection import MessageHandler, MessageType, WebSocketMessage
+
+if TYPE_CHECKING:
+    from injective_bot.connection.injective_client import InjectiveStreamClient
+
+logger = logging.getLogger(__name__)
+
+# Interned once here so every debug script refers to the same string objects
+INJ_USDT = sys.intern("0x0511ddc4e6586f3bfe1acb2dd905f8b8a82c97e1edaef654b12ca7e6031ca0fa")  # INJ/USDT
+BTC_USDT = sys.intern("0x4ca0f92fc28be0c9761326016b5a1a2177dd6375558365116b5bdda9abc229ce")  # BTC/USDT
+WETH_USDT = sys.intern("0xd1956e20d74eeb1febe31cd37060781ff1cb266f49e0512b446a5fafa9a16034")  # WETH/USDT
+
+# Message types the collectors subscribe to - shared, immutable
+COLLECTED_TYPES = frozenset({MessageType.ORDERBOOK, MessageType.TRADES, MessageType.MARKET_DATA})
+
+# Bound on messages waiting for a collector's drain task
+QUEUE_MAXSIZE = 10000
+# Most recent messages a collector keeps for inspection
+MESSAGE_HISTORY = 50_000
+
+# Longest a test's teardown waits for the client to disconnect
+DISCONNECT_TIMEOUT = 2.0
+
+@dataclass(slots=True)
+class CallbackCounter:
+    """Callback count shared with a stream callback without a nonlocal cell"""
+    count: int = 0
+
+async def disconnect_bounded(client: "InjectiveStreamClient") -> None:
+    """Disconnect without letting a stalled stream hold up teardown for more than DISCONNECT_TIMEOUT"""
+    try:
+        # shield: on timeout the disconnect keeps running instead of being cancelled mid-close
+        await asyncio.wait_for(asyncio.shield(client.disconnect()), timeout=DISCONNECT_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning("disconnect timed out")
+
+class QueuedCollector(MessageHandler):
+    """
+    Collector that enqueues messages inline and processes them in batches on one drain task
+    
+    Subclasses implement _process_batch; start() and stop() bracket each test.
+    """
+    
+    __slots__ = ('dropped', '_queue', '_drain_task')
+    
+    # Enqueue inline from the client's dispatch loop; one drain task processes batches
+    on_message_sync = True
+    
+    def __init__(self):
+        self.dropped = 0
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_MAXSIZE)
+        self._drain_task: Optional[asyncio.Task] = None
+        
+    def get_supported_message_types(self) -> FrozenSet[MessageType]:
+        return COLLECTED_TYPES
+    
+    def on_message(self, message: WebSocketMessage) -> None:
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.dropped += 1
+    
+    def reset(self) -> None:
+        """Discard still-queued messages before the next test"""
+        while not self._queue.empty():
+            self._queue.get_nowait()
+    
+    def start(self) -> None:
+        """Start the task draining queued messages"""
+        if self._drain_task is None:
+            self._drain_task = asyncio.create_task(self._drain())
+    
+    async def stop(self) -> None:
+        """Cancel the drain task and process whatever is still queued"""
+        task, self._drain_task = self._drain_task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            self._process_batch(batch)
+    
+    async def _drain(self) -> None:
+        queue = self._queue
+        while True:
+            # Block for one message, then take everything else already waiting
+            batch = [await queue.get()]
+            while True:
+                try:
+                    batch.append(queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            self._process_batch(batch)
+    
+    async def handle_message(self, message: WebSocketMessage) -> None:
+        self._process_batch([message])
+    
+    @abstractmethod
+    def _process_batch(self, batch: List[WebSocketMessage]) -> None:
+        """Handle a batch of messages, in arrival order"""
@@ -6,54 +6,110 @@ This script uses the exact pattern from official injective-py examples.
 
 import asyncio
 import logging
+from collections import Counter
 from typing import List
 from pyinjective.async_client import AsyncClient
 from pyinjective.core.network import Network
+from debug_markets import BTC_USDT, WETH_USDT
+from src.injective_bot.connection.network_utils import close_client, run
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Network config built once per run
+MAINNET = Network.mainnet()
+
 # Market IDs to test
 MARKET_IDS = [
-    "0x4ca0f92fc28be0c9761326016b5a1a2177dd6375558365116b5bdda9abc229ce",  # BTC/USDT
-    "0xd1956e20d74eeb1febe31cd37060781ff1cb266f49e0512b446a5fafa9a16034",  # WETH/USDT
+    BTC_USDT,
+    WETH_USDT,
 ]
 
+# Seconds between passes over buffered orderbook events
+FLUSH_INTERVAL = 0.05
+# Events after which a test stops early, once every market has reported
+MESSAGE_TARGET = 100
+
 class MinimalSubscriptionTest:
     def __init__(self):
         self.message_count = 0
-        self.market_data = {}
+        self.market_data = Counter()
+        self._buffer = []
+        self._expected_markets = 0
+        self._done = asyncio.Event()
+    
+    def reset(self):
+        """Clear counters and buffered events between tests"""
+        self.message_count = 0
+        self.market_data = Counter()
+        self._buffer = []
+        self._expected_markets = 0
+        self._done = asyncio.Event()
     
     def orderbook_event_processor(self, event):
-        """Callback function to process orderbook events - matches official examples"""
+        """Callback function for orderbook events - buffers them for batch processing"""
+        self._buffer.append(event)
+    
+    def _process_batch(self):
+        """Process all buffered events in one pass with a single summary log line"""
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        
+        self.message_count += len(batch)
+        market_data = self.market_data
+        unexpected = 0
+        for event in batch:
+            try:
+                orderbook = getattr(event, 'orderbook', None)
+                if orderbook:
+                    market_data[orderbook.market_id] += 1
+                else:
+                    unexpected += 1
+            except Exception as e:
+                logger.error(f"Error processing orderbook event: {e}")
+        
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Processed %d events (total %d) - Market data counts: %s",
+                        len(batch), self.message_count, dict(market_data))
+        if unexpected:
+            logger.warning(f"{unexpected} events with unexpected structure: {type(batch[-1])}")
+        if self.message_count >= MESSAGE_TARGET and len(self.market_data) >= self._expected_markets:
+            self._done.set()
+    
+    async def _flusher(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            self._process_batch()
+    
+    async def _collect(self, client, market_ids, duration=10.0):
+        """Stream orderbook updates for up to duration seconds, processing them in batches"""
+        # One stream per call; duplicate ids would only repeat the same updates
+        market_ids = list(dict.fromkeys(market_ids))
+        self._expected_markets = len(market_ids)
+        task = asyncio.create_task(
+            client.listen_spot_orderbook_updates(
+                market_ids=market_ids,
+                callback=self.orderbook_event_processor
+            )
+        )
+        flusher = asyncio.create_task(self._flusher())
         try:
-            self.message_count += 1
-            
-            # Log the event structure to understand what we're receiving
-            if hasattr(event, 'orderbook') and event.orderbook:
-                market_id = event.orderbook.market_id
-                if market_id not in self.market_data:
-                    self.market_data[market_id] = 0
-                self.market_data[market_id] += 1
-                
-                logger.info(f"Message #{self.message_count} - Market: {market_id[:8]}...")
-                logger.info(f"Market data counts: {self.market_data}")
-            else:
-                logger.warning(f"Message #{self.message_count} - Unexpected event structure: {type(event)}")
-                
-        except Exception as e:
-            logger.error(f"Error processing orderbook event: {e}")
+            await asyncio.wait_for(self._done.wait(), timeout=duration)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            task.cancel()
+            flusher.cancel()
+            await asyncio.gather(task, flusher, return_exceptions=True)
+            self._process_batch()
     
-    async def test_single_market(self):
+    async def test_single_market(self, client):
         """Test single market subscription - this should work"""
         logger.info("=== Testing Single Market Subscription ===")
         
-        network = Network.mainnet()
-        client = AsyncClient(network)
-        
-        self.message_count = 0
-        self.market_data = {}
+        self.reset()
         
         try:
             # Test with just the first market
@@ -61,34 +117,19 @@ class MinimalSubscriptionTest:
             logger.info(f"Subscribing to single market: {single_market[0][:8]}...")
             
             # Start subscription
-            task = asyncio.create_task(
-                client.listen_spot_orderbook_updates(
-                    market_ids=single_market,
-                    callback=self.orderbook_event_processor
-                )
-            )
-            
-            # Wait for messages
-            await asyncio.sleep(10)
-            task.cancel()
+            await self._collect(client, single_market)
             
             logger.info(f"Single market test result: {self.message_count} messages received")
-            logger.info(f"Market data: {self.market_data}")
+            logger.info(f"Market data: {dict(self.market_data)}")
             
         except Exception as e:
             logger.error(f"Single market test failed: {e}")
-        finally:
-            await client.close_client()
     
-    async def test_multiple_markets(self):
+    async def test_multiple_markets(self, client):
         """Test multiple market subscription - this is failing"""
         logger.info("=== Testing Multiple Market Subscription ===")
         
-        network = Network.mainnet()
-        client = AsyncClient(network)
-        
-        self.message_count = 0
-        self.market_data = {}
+        self.reset()
         
         try:
             logger.info(f"Subscribing to {len(MARKET_IDS)} markets:")
@@ -96,19 +137,10 @@ class MinimalSubscriptionTest:
                 logger.info(f"  {i+1}. {market_id[:8]}...")
             
             # Start subscription - using exact same pattern as official examples
-            task = asyncio.create_task(
-                client.listen_spot_orderbook_updates(
-                    market_ids=MARKET_IDS,
-                    callback=self.orderbook_event_processor
-                )
-            )
-            
-            # Wait for messages
-            await asyncio.sleep(10)
-            task.cancel()
+            await self._collect(client, MARKET_IDS)
             
             logger.info(f"Multiple market test result: {self.message_count} messages received")
-            logger.info(f"Market data: {self.market_data}")
+            logger.info(f"Market data: {dict(self.market_data)}")
             
             # Check if all markets received data
             active_markets = len(self.market_data)
@@ -119,10 +151,8 @@ class MinimalSubscriptionTest:
             
         except Exception as e:
             logger.error(f"Multiple market test failed: {e}")
-        finally:
-            await client.close_client()
     
-    async def test_official_example_markets(self):
+    async def test_official_example_markets(self, client):
         """Test with the exact market IDs from official examples"""
         logger.info("=== Testing Official Example Markets ===")
         
@@ -132,11 +162,7 @@ class MinimalSubscriptionTest:
             "0x7a57e705bb4e09c88aecfc295569481dbf2fe1d5efe364651fbe72385938e9b0",  # From example
         ]
         
-        network = Network.mainnet()
-        client = AsyncClient(network)
-        
-        self.message_count = 0
-        self.market_data = {}
+        self.reset()
         
         try:
             logger.info(f"Testing with official example markets:")
@@ -144,39 +170,33 @@ class MinimalSubscriptionTest:
                 logger.info(f"  {i+1}. {market_id[:8]}...")
             
             # Start subscription
-            task = asyncio.create_task(
-                client.listen_spot_orderbook_updates(
-                    market_ids=official_markets,
-                    callback=self.orderbook_event_processor
-                )
-            )
-            
-            # Wait for messages
-            await asyncio.sleep(10)
-            task.cancel()
+            await self._collect(client, official_markets)
             
             logger.info(f"Official markets test result: {self.message_count} messages received")
-            logger.info(f"Market data: {self.market_data}")
+            logger.info(f"Market data: {dict(self.market_data)}")
             
         except Exception as e:
             logger.error(f"Official markets test failed: {e}")
-        finally:
-            await client.close_client()
 
 async def main():
     """Run all tests"""
     tester = MinimalSubscriptionTest()
+    # One client for all tests; each test cancels its stream before returning
+    client = AsyncClient(MAINNET)
     
-    # Test 1: Single market (should work)
-    await tester.test_single_market()
-    await asyncio.sleep(2)
-    
-    # Test 2: Multiple markets (currently failing)
-    await tester.test_multiple_markets()
-    await asyncio.sleep(2)
-    
-    # Test 3: Official example markets
-    await tester.test_official_example_markets()
+    try:
+        # Test 1: Single market (should work)
+        await tester.test_single_market(client)
+        await asyncio.sleep(2)
+        
+        # Test 2: Multiple markets (currently failing)
+        await tester.test_multiple_markets(client)
+        await asyncio.sleep(2)
+        
+        # Test 3: Official example markets
+        await tester.test_official_example_markets(client)
+    finally:
+        await close_client(client)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run(main())
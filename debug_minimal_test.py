@@ -5,34 +5,44 @@ Test with minimal setup to isolate the issue
 
 import asyncio
 import logging
+import traceback
+from itertools import islice
 from pyinjective.async_client import AsyncClient
 from pyinjective.core.network import Network
+from debug_markets import CallbackCounter, INJ_USDT
+from src.injective_bot.connection.network_utils import run
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Network config built once per run
+MAINNET = Network.mainnet()
+
 async def test_minimal_subscription():
     """Test minimal subscription setup"""
     try:
         # Use mainnet as per user preference
         logger.info("Creating mainnet client...")
-        client = AsyncClient(Network.mainnet())
+        client = AsyncClient(MAINNET)
         
         # Known INJ/USDT market ID from mainnet (from our test)
-        market_id = "0x0511ddc4e6586f3bfe1acb2dd905f8b8a82c97e1edaef654b12ca7e6031ca0fa"
+        market_id = INJ_USDT
         
         logger.info(f"Testing with market ID: {market_id}")
         
-        callback_count = 0
+        counter = CallbackCounter()
+        enough = asyncio.Event()
         
         def simple_callback(data):
-            nonlocal callback_count
-            callback_count += 1
-            logger.info(f"CALLBACK #{callback_count}: {type(data)}")
-            if isinstance(data, dict):
-                logger.info(f"  Data keys: {list(data.keys())[:5]}")  # Show first 5 keys
-            if callback_count >= 3:  # Stop after 3 callbacks
+            counter.count += 1
+            callback_count = counter.count
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("CALLBACK #%d: %s", callback_count, type(data).__name__)
+            if isinstance(data, dict) and logger.isEnabledFor(logging.DEBUG):
+                logger.debug("  Data keys: %s", list(islice(data, 5)))  # Show first 5 keys
+            if callback_count == 3:  # Report once after 3 callbacks
                 logger.info("Got enough data, callback working!")
+                enough.set()
         
         logger.info("Starting orderbook subscription...")
         
@@ -44,9 +54,12 @@ async def test_minimal_subscription():
             )
         )
         
-        # Wait for 20 seconds
-        logger.info("Waiting 20 seconds for callbacks...")
-        await asyncio.sleep(20)
+        # Wait up to 20 seconds, stopping as soon as enough callbacks arrived
+        logger.info("Waiting up to 20 seconds for callbacks...")
+        try:
+            await asyncio.wait_for(enough.wait(), timeout=20)
+        except asyncio.TimeoutError:
+            pass
         
         logger.info("Cancelling subscription...")
         task.cancel()
@@ -56,6 +69,7 @@ async def test_minimal_subscription():
         except asyncio.CancelledError:
             logger.info("Task cancelled successfully")
         
+        callback_count = counter.count
         logger.info(f"Total callbacks received: {callback_count}")
         
         if callback_count == 0:
@@ -67,10 +81,9 @@ async def test_minimal_subscription():
         
     except Exception as e:
         logger.error(f"Error in minimal test: {e}")
-        import traceback
         logger.error(traceback.format_exc())
         return 0
 
 if __name__ == "__main__":
-    result = asyncio.run(test_minimal_subscription())
+    result = run(test_minimal_subscription())
     print(f"\nFinal callback count: {result}")
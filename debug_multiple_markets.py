@@ -5,106 +5,128 @@ Debug multiple market subscriptions to identify the issue
 
 import asyncio
 import logging
-from datetime import datetime, timezone
-from typing import List
+import time
+from collections import deque
+from typing import Any, Dict, List
 
-from injective_bot.connection import ConnectionState, MessageType, WebSocketMessage, MessageHandler
+from injective_bot.connection import ConnectionState, WebSocketMessage
 from injective_bot.connection.injective_client import InjectiveStreamClient
 from injective_bot.config import WebSocketConfig
+from injective_bot.connection.network_utils import run
+from debug_markets import BTC_USDT, INJ_USDT, MESSAGE_HISTORY, QueuedCollector
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class SimpleDebugCollector(MessageHandler):
+# (name, market ids, subscription types) for each scenario
+SCENARIOS = (
+    ("Single Market - Orderbook Only", [INJ_USDT], ["orderbook"]),
+    ("Single Market - Trades Only", [INJ_USDT], ["trades"]),
+    ("Single Market - Both", [INJ_USDT], ["orderbook", "trades"]),
+    ("Two Markets - Orderbook Only", [INJ_USDT, BTC_USDT], ["orderbook"]),
+    ("Two Markets - Both", [INJ_USDT, BTC_USDT], ["orderbook", "trades"]),
+)
+
+class SimpleDebugCollector(QueuedCollector):
+    __slots__ = ('messages', 'message_count', 'start_time')
+    
     def __init__(self):
-        self.messages = []
+        super().__init__()
+        self.messages = deque(maxlen=MESSAGE_HISTORY)
+        self.message_count = 0
         self.start_time = None
-        
-    def get_supported_message_types(self) -> List[MessageType]:
-        return [MessageType.ORDERBOOK, MessageType.TRADES, MessageType.MARKET_DATA]
     
-    async def handle_message(self, message: WebSocketMessage) -> None:
+    def _process_batch(self, batch: List[WebSocketMessage]) -> None:
         if self.start_time is None:
-            self.start_time = datetime.now(timezone.utc)
-        self.messages.append(message)
-        logger.info(f"📨 Message #{len(self.messages)}: {message.message_type.value} for {message.market_id}")
+            self.start_time = time.monotonic()
+        self.messages.extend(batch)
+        self.message_count += len(batch)
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        last = batch[-1]
+        logger.info("📨 %d messages (total %d), last: %s for %s",
+                    len(batch), self.message_count, last.message_type.value, last.market_id)
+
+async def run_scenario(config: WebSocketConfig, scenario_name: str, markets: List[str],
+                       subscription_types: List[str]) -> Dict[str, Any]:
+    """Run one subscription scenario on its own client and return its results"""
+    result = {'scenario': scenario_name, 'message_count': 0, 'markets_with_data': 0}
+    logger.info(f"\n🧪 Testing: {scenario_name}")
+    logger.info(f"   Markets: {len(markets)}")
+    logger.info(f"   Subscriptions: {subscription_types}")
+    
+    client = InjectiveStreamClient(config=config, network="mainnet")
+    collector = SimpleDebugCollector()
+    client.register_handler(collector)
+    
+    try:
+        # Connect
+        connected = await client.connect()
+        if not connected:
+            logger.error(f"❌ Failed to connect for {scenario_name}")
+            return result
+        
+        logger.info(f"✅ Connected for {scenario_name}")
+        collector.start()
+        
+        # Subscribe based on scenario
+        if "orderbook" in subscription_types:
+            await client.subscribe_spot_orderbook_updates(markets)
+            logger.info(f"📊 Subscribed to orderbook for {len(markets)} markets")
+        
+        if "trades" in subscription_types:
+            await client.subscribe_spot_trades_updates(markets)
+            logger.info(f"💱 Subscribed to trades for {len(markets)} markets")
+        
+        # Wait for data
+        logger.info(f"⏰ Waiting 15 seconds for data...")
+        await asyncio.sleep(15)
+    
+    except Exception as e:
+        logger.error(f"❌ Error in {scenario_name}: {e}")
+    
+    finally:
+        await collector.stop()
+        if client.get_connection_state() == ConnectionState.CONNECTED:
+            await client.disconnect()
+    
+    # Results
+    message_count = collector.message_count
+    result['message_count'] = message_count
+    logger.info(f"📊 [{scenario_name}] RESULT: {message_count} messages received")
+    
+    if message_count > 0:
+        markets_seen = {msg.market_id for msg in collector.messages if msg.market_id}
+        message_types = {msg.message_type for msg in collector.messages}
+        
+        result['markets_with_data'] = len(markets_seen)
+        logger.info(f"   [{scenario_name}] Markets with data: {len(markets_seen)}/{len(markets)}")
+        logger.info(f"   [{scenario_name}] Message types: {[mt.value for mt in message_types]}")
+        logger.info(f"   [{scenario_name}] Success rate: {message_count/15:.1f} msg/sec")
+    else:
+        logger.warning(f"❌ No messages received for {scenario_name}")
+    
+    logger.info(f"✅ Completed {scenario_name}")
+    return result
 
 async def test_subscription_scenarios():
     """Test different subscription scenarios"""
     
     config = WebSocketConfig(connection_timeout=30.0)
     
-    scenarios = [
-        ("Single Market - Orderbook Only", ["0x0511ddc4e6586f3bfe1acb2dd905f8b8a82c97e1edaef654b12ca7e6031ca0fa"], ["orderbook"]),
-        ("Single Market - Trades Only", ["0x0511ddc4e6586f3bfe1acb2dd905f8b8a82c97e1edaef654b12ca7e6031ca0fa"], ["trades"]),
-        ("Single Market - Both", ["0x0511ddc4e6586f3bfe1acb2dd905f8b8a82c97e1edaef654b12ca7e6031ca0fa"], ["orderbook", "trades"]),
-        ("Two Markets - Orderbook Only", [
-            "0x0511ddc4e6586f3bfe1acb2dd905f8b8a82c97e1edaef654b12ca7e6031ca0fa",
-            "0x4ca0f92fc28be0c9761326016b5a1a2177dd6375558365116b5bdda9abc229ce"
-        ], ["orderbook"]),
-        ("Two Markets - Both", [
-            "0x0511ddc4e6586f3bfe1acb2dd905f8b8a82c97e1edaef654b12ca7e6031ca0fa",
-            "0x4ca0f92fc28be0c9761326016b5a1a2177dd6375558365116b5bdda9abc229ce"
-        ], ["orderbook", "trades"]),
-    ]
+    # Every scenario has its own client and collector, so the 15s waits overlap
+    results = await asyncio.gather(
+        *(run_scenario(config, *scenario) for scenario in SCENARIOS),
+        return_exceptions=True
+    )
     
-    for scenario_name, markets, subscription_types in scenarios:
-        logger.info(f"\n🧪 Testing: {scenario_name}")
-        logger.info(f"   Markets: {len(markets)}")
-        logger.info(f"   Subscriptions: {subscription_types}")
-        
-        client = InjectiveStreamClient(config=config, network="mainnet")
-        collector = SimpleDebugCollector()
-        client.register_handler(collector)
-        
-        try:
-            # Connect
-            connected = await client.connect()
-            if not connected:
-                logger.error(f"❌ Failed to connect for {scenario_name}")
-                continue
-                
-            logger.info(f"✅ Connected for {scenario_name}")
-            
-            # Subscribe based on scenario
-            if "orderbook" in subscription_types:
-                await client.subscribe_spot_orderbook_updates(markets)
-                logger.info(f"📊 Subscribed to orderbook for {len(markets)} markets")
-                
-            if "trades" in subscription_types:
-                await client.subscribe_spot_trades_updates(markets)
-                logger.info(f"💱 Subscribed to trades for {len(markets)} markets")
-            
-            # Wait for data
-            logger.info(f"⏰ Waiting 15 seconds for data...")
-            await asyncio.sleep(15)
-            
-            # Results
-            message_count = len(collector.messages)
-            logger.info(f"📊 RESULT: {message_count} messages received")
-            
-            if message_count > 0:
-                markets_seen = set()
-                message_types = set()
-                for msg in collector.messages:
-                    if msg.market_id:
-                        markets_seen.add(msg.market_id)
-                    message_types.add(msg.message_type)
-                
-                logger.info(f"   Markets with data: {len(markets_seen)}/{len(markets)}")
-                logger.info(f"   Message types: {[mt.value for mt in message_types]}")
-                logger.info(f"   Success rate: {message_count/15:.1f} msg/sec")
-            else:
-                logger.warning(f"❌ No messages received for {scenario_name}")
-                
-        except Exception as e:
-            logger.error(f"❌ Error in {scenario_name}: {e}")
-            
-        finally:
-            if client.get_connection_state() == ConnectionState.CONNECTED:
-                await client.disconnect()
-                
-        logger.info(f"✅ Completed {scenario_name}")
+    logger.info("\n📋 SUMMARY")
+    for (scenario_name, _, _), result in zip(SCENARIOS, results):
+        if isinstance(result, BaseException):
+            logger.error(f"   {scenario_name}: ❌ {result}")
+        else:
+            logger.info(f"   {scenario_name}: {result['message_count']} messages, "
+                        f"{result['markets_with_data']} markets with data")
 
 if __name__ == "__main__":
-    asyncio.run(test_subscription_scenarios())
+    run(test_subscription_scenarios())
@@ -8,23 +8,29 @@ import logging
 from datetime import datetime, timezone
 from typing import List
 
-from injective_bot.connection import ConnectionState, MessageType, WebSocketMessage, MessageHandler
+from injective_bot.connection import ConnectionState, WebSocketMessage
 from injective_bot.connection.injective_client import InjectiveStreamClient
 from injective_bot.config import WebSocketConfig
+from injective_bot.connection.network_utils import run
+from debug_markets import INJ_USDT, QueuedCollector
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class QuickCollector(MessageHandler):
+class QuickCollector(QueuedCollector):
+    __slots__ = ('count',)
+    
     def __init__(self):
+        super().__init__()
         self.count = 0
-        
-    def get_supported_message_types(self) -> List[MessageType]:
-        return [MessageType.ORDERBOOK, MessageType.TRADES, MessageType.MARKET_DATA]
     
-    async def handle_message(self, message: WebSocketMessage) -> None:
-        self.count += 1
-        logger.info(f"✅ Message {self.count}: {message.message_type.value} - {message.market_id}")
+    def _process_batch(self, batch: List[WebSocketMessage]) -> None:
+        self.count += len(batch)
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        last = batch[-1]
+        logger.info("✅ %d messages (total %d), last: %s - %s",
+                    len(batch), self.count, last.message_type.value, last.market_id)
 
 async def quick_test():
     """Quick test of what we know works vs what doesn't"""
@@ -46,9 +52,10 @@ async def quick_test():
             return
             
         logger.info("✅ Connected")
+        collector.start()
         
         # Test the exact pattern we know works (from successful single market test)
-        single_market = ["0x0511ddc4e6586f3bfe1acb2dd905f8b8a82c97e1edaef654b12ca7e6031ca0fa"]
+        single_market = [INJ_USDT]
         
         logger.info("📊 Subscribing to orderbook updates...")
         await client.subscribe_spot_orderbook_updates(single_market)
@@ -58,20 +65,21 @@ async def quick_test():
         
         logger.info("⏰ Waiting 10 seconds...")
         await asyncio.sleep(10)
-        
-        logger.info(f"📊 RESULT: {collector.count} messages received")
-        
-        if collector.count > 0:
-            logger.info("✅ SUCCESS - Single market with both subscriptions works")
-        else:
-            logger.error("❌ FAILURE - Even known working pattern failed")
             
     except Exception as e:
         logger.error(f"❌ Error: {e}")
         
     finally:
+        await collector.stop()
         if client.get_connection_state() == ConnectionState.CONNECTED:
             await client.disconnect()
+    
+    logger.info(f"📊 RESULT: {collector.count} messages received")
+    
+    if collector.count > 0:
+        logger.info("✅ SUCCESS - Single market with both subscriptions works")
+    else:
+        logger.error("❌ FAILURE - Even known working pattern failed")
 
 if __name__ == "__main__":
-    asyncio.run(quick_test())
+    run(quick_test())
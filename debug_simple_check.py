@@ -4,106 +4,99 @@ Simple debug check to isolate the issue
 """
 
 import asyncio
+import atexit
 import logging
+import logging.handlers
+import queue
+from collections import deque
 from datetime import datetime, timezone
 from typing import List
 
-from injective_bot.connection import ConnectionState, MessageType, WebSocketMessage, MessageHandler
+from injective_bot.connection import ConnectionState, WebSocketMessage
 from injective_bot.connection.injective_client import InjectiveStreamClient
 from injective_bot.config import WebSocketConfig
+from injective_bot.connection.network_utils import run
+from debug_markets import BTC_USDT, INJ_USDT, MESSAGE_HISTORY, QueuedCollector
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+# Log records are written by a background listener thread, keeping stdout writes off the event loop
+_log_queue = queue.Queue()
+_log_listener = logging.handlers.QueueListener(_log_queue, logging.StreamHandler())
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[logging.handlers.QueueHandler(_log_queue)],
+    force=True  # replace any root handler installed by imported libraries
+)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 logger = logging.getLogger(__name__)
 
-class SimpleCollector(MessageHandler):
+class SimpleCollector(QueuedCollector):
+    __slots__ = ('messages', 'message_count')
+    
     def __init__(self):
-        self.messages = []
-        
-    def get_supported_message_types(self) -> List[MessageType]:
-        return [MessageType.ORDERBOOK, MessageType.TRADES, MessageType.MARKET_DATA]
+        super().__init__()
+        self.messages = deque(maxlen=MESSAGE_HISTORY)
+        self.message_count = 0
+    
+    def reset(self) -> None:
+        """Forget collected and still-queued messages before the next test"""
+        super().reset()
+        self.messages.clear()
+        self.message_count = 0
     
-    async def handle_message(self, message: WebSocketMessage) -> None:
-        self.messages.append(message)
-        print(f"✅ Message #{len(self.messages)}: {message.message_type.value} for {message.market_id}")
+    def _process_batch(self, batch: List[WebSocketMessage]) -> None:
+        self.messages.extend(batch)
+        self.message_count += len(batch)
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        last = batch[-1]
+        logger.info("✅ %d messages (total %d), last: %s for %s",
+                    len(batch), self.message_count, last.message_type.value, last.market_id)
 
 async def test_simple_scenarios():
     """Test simple scenarios"""
     
     config = WebSocketConfig(connection_timeout=30.0)
-    btc_usdt = "0x0511ddc4e6586f3bfe1acb2dd905f8b8a82c97e1edaef654b12ca7e6031ca0fa"
-    eth_usdt = "0x4ca0f92fc28be0c9761326016b5a1a2177dd6375558365116b5bdda9abc229ce"
-    
-    print("\n=== TEST 1: Single Market Orderbook ===")
-    client1 = InjectiveStreamClient(config=config, network="mainnet")
-    collector1 = SimpleCollector()
-    client1.register_handler(collector1)
-    
-    try:
-        connected = await client1.connect()
-        print(f"Connected: {connected}")
-        
-        if connected:
-            await client1.subscribe_spot_orderbook_updates([btc_usdt])
-            print("Subscribed to BTC-USDT orderbook")
-            
-            print("Waiting 10 seconds...")
-            await asyncio.sleep(10)
-            
-            print(f"Messages received: {len(collector1.messages)}")
-            
-    except Exception as e:
-        print(f"Error: {e}")
-    finally:
-        if client1.get_connection_state() == ConnectionState.CONNECTED:
-            await client1.disconnect()
-    
-    print("\n=== TEST 2: Single Market Trades ===")
-    client2 = InjectiveStreamClient(config=config, network="mainnet")
-    collector2 = SimpleCollector()
-    client2.register_handler(collector2)
     
-    try:
-        connected = await client2.connect()
-        print(f"Connected: {connected}")
-        
-        if connected:
-            await client2.subscribe_spot_trades_updates([btc_usdt])
-            print("Subscribed to BTC-USDT trades")
-            
-            print("Waiting 10 seconds...")
-            await asyncio.sleep(10)
-            
-            print(f"Messages received: {len(collector2.messages)}")
-            
-    except Exception as e:
-        print(f"Error: {e}")
-    finally:
-        if client2.get_connection_state() == ConnectionState.CONNECTED:
-            await client2.disconnect()
+    # One connection serves every test; each test swaps in its own subscriptions
+    client = InjectiveStreamClient(config=config, network="mainnet")
+    collector = SimpleCollector()
+    client.register_handler(collector)
     
-    print("\n=== TEST 3: Two Markets Orderbook ===")
-    client3 = InjectiveStreamClient(config=config, network="mainnet")
-    collector3 = SimpleCollector()
-    client3.register_handler(collector3)
+    tests = [
+        ("TEST 1: Single Market Orderbook", client.subscribe_spot_orderbook_updates, [INJ_USDT],
+         "Subscribed to INJ-USDT orderbook"),
+        ("TEST 2: Single Market Trades", client.subscribe_spot_trades_updates, [INJ_USDT],
+         "Subscribed to INJ-USDT trades"),
+        ("TEST 3: Two Markets Orderbook", client.subscribe_spot_orderbook_updates, [INJ_USDT, BTC_USDT],
+         "Subscribed to INJ-USDT + BTC-USDT orderbook"),
+    ]
     
     try:
-        connected = await client3.connect()
-        print(f"Connected: {connected}")
+        connected = await client.connect()
+        logger.info("Connected: %s", connected)
+        if not connected:
+            return
         
-        if connected:
-            await client3.subscribe_spot_orderbook_updates([btc_usdt, eth_usdt])
-            print("Subscribed to BTC-USDT + ETH-USDT orderbook")
-            
-            print("Waiting 10 seconds...")
-            await asyncio.sleep(10)
-            
-            print(f"Messages received: {len(collector3.messages)}")
+        for title, subscribe, markets, description in tests:
+            logger.info("\n=== %s ===", title)
+            collector.reset()
+            collector.start()
             
-    except Exception as e:
-        print(f"Error: {e}")
+            try:
+                await subscribe(markets)
+                logger.info("%s\nWaiting 10 seconds...", description)
+                await asyncio.sleep(10)
+            except Exception as e:
+                logger.error("Error: %s", e)
+            finally:
+                await client.unsubscribe_all()
+                await collector.stop()
+            logger.info("Messages received: %d", collector.message_count)
     finally:
-        if client3.get_connection_state() == ConnectionState.CONNECTED:
-            await client3.disconnect()
+        if client.get_connection_state() == ConnectionState.CONNECTED:
+            await client.disconnect()
 
 if __name__ == "__main__":
-    asyncio.run(test_simple_scenarios())
+    run(test_simple_scenarios())
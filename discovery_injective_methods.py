@@ -11,14 +11,19 @@ This script will:
 """
 
 import asyncio
+import heapq
 import inspect
 import logging
-from datetime import datetime, timezone
-from typing import Dict, List, Set, Any, Optional
+import operator
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Set, Tuple, Any, Optional
 from dataclasses import dataclass, field
 from pyinjective.async_client import AsyncClient
 from pyinjective.core.network import Network
 
+from src.injective_bot.connection.network_utils import run, write_json
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -26,6 +31,68 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Most listen_* streams probed at the same time
+MAX_CONCURRENT_STREAMS = 4
+
+# Market id accessor per streamed message type, resolved on the first message of each type
+_MARKET_ID_GETTERS: Dict[type, Callable[[Any], Optional[str]]] = {}
+
+def _market_id_of(message: Any) -> Optional[str]:
+    """Return the market id a streamed message carries, if any"""
+    message_type = type(message)
+    getter = _MARKET_ID_GETTERS.get(message_type)
+    if getter is None:
+        for name in ('market_id', 'marketId'):
+            if hasattr(message, name):
+                getter = operator.attrgetter(name)
+                break
+        else:
+            getter = lambda _message: None
+        _MARKET_ID_GETTERS[message_type] = getter
+    return getter(message)
+
+# Ranking key for probe results
+_by_message_rate = operator.attrgetter('message_rate')
+
+def _with_market_ids(markets: List[str]) -> Dict[str, Any]:
+    return {'market_ids': markets}
+
+def _without_args(markets: List[str]) -> Dict[str, Any]:
+    return {}
+
+# Call arguments for the known AsyncClient listen_* methods (callbacks are added by the caller);
+# methods missing from both tables fall back to inspecting their parameters
+_CALL_SPECS: Dict[str, Callable[[List[str]], Dict[str, Any]]] = {
+    'listen_spot_orderbook_updates': _with_market_ids,
+    'listen_spot_orderbook_snapshots': _with_market_ids,
+    'listen_spot_markets_updates': _with_market_ids,
+    'listen_derivative_orderbook_updates': _with_market_ids,
+    'listen_derivative_orderbook_snapshots': _with_market_ids,
+    'listen_derivative_market_updates': _with_market_ids,
+    'listen_derivative_positions_updates': _with_market_ids,
+    'listen_bids_updates': _without_args,
+    'listen_blocks_updates': _without_args,
+    'listen_chain_stream_updates': _without_args,
+    'listen_keepalive': _without_args,
+    'listen_oracle_prices_updates': _without_args,
+    'listen_txs_updates': _without_args,
+}
+
+# Parameters that tie a listen_* stream to an account; methods taking any of them are not probed
+_ACCOUNT_PARAMS = ('subaccount_id', 'order_side', 'execution_side')
+
+# Known listen_* methods that need an account-specific parameter, mapped to that parameter
+_SKIPPED_METHODS: Dict[str, str] = {
+    'listen_account_portfolio_updates': 'subaccount_id',
+    'listen_subaccount_balance_updates': 'subaccount_id',
+    'listen_spot_orders_history_updates': 'subaccount_id',
+    'listen_derivative_orders_history_updates': 'subaccount_id',
+    'listen_spot_orders_updates': 'order_side',
+    'listen_derivative_orders_updates': 'order_side',
+    'listen_spot_trades_updates': 'execution_side',
+    'listen_derivative_trades_updates': 'execution_side',
+}
+
 @dataclass
 class MethodResult:
     """Track results for each listen method"""
@@ -61,66 +128,86 @@ class MethodDiscovery:
             logger.error(f"❌ Failed to initialize client: {e}")
             return False
     
-    def discover_listen_methods(self) -> List[str]:
-        """Find all listen_* methods available in AsyncClient"""
+    def discover_listen_methods(self) -> List[Tuple[str, Optional[inspect.Signature], Callable]]:
+        """Find all listen_* methods available in AsyncClient, with their signatures and bound methods"""
         if not self.client:
             return []
         
         methods = []
-        for name in dir(self.client):
-            if name.startswith('listen_') and callable(getattr(self.client, name)):
-                methods.append(name)
+        for name in sorted(dir(self.client)):
+            if not name.startswith('listen_'):
+                continue
+            method_obj = getattr(self.client, name)
+            if callable(method_obj):
+                methods.append((name, method_obj))
         
         logger.info(f"🔍 Found {len(methods)} listen_* methods:")
-        for method in sorted(methods):
-            # Get method signature
-            method_obj = getattr(self.client, method)
+        discovered = []
+        for name, method_obj in methods:
+            # Account-specific streams are dropped here, before any probe is set up for them
+            required = _SKIPPED_METHODS.get(name)
+            if required is not None:
+                logger.info(f"  ⏩ Skipping {name} - requires {required}")
+                continue
+            
+            # Resolve each signature once; test_method reuses it
             try:
                 sig = inspect.signature(method_obj)
-                logger.info(f"  📋 {method}{sig}")
             except Exception:
-                logger.info(f"  📋 {method} (signature unavailable)")
+                logger.info(f"  📋 {name} (signature unavailable)")
+                discovered.append((name, None, method_obj))
+                continue
+            
+            required = next((param for param in _ACCOUNT_PARAMS if param in sig.parameters), None)
+            if required is not None:
+                logger.info(f"  ⏩ Skipping {name} - requires {required}")
+                continue
+            
+            logger.info(f"  📋 {name}{sig}")
+            discovered.append((name, sig, method_obj))
         
-        return methods
+        return discovered
     
-    async def test_method(self, method_name: str, timeout: int = 15) -> MethodResult:
-        """Test a specific listen method"""
+    async def test_method(self, method_name: str, sig: Optional[inspect.Signature],
+                          method: Callable, timeout: int = 15) -> MethodResult:
+        """Test a specific listen method, given its discovered signature and bound method"""
         result = MethodResult(method_name=method_name)
         
         logger.info(f"\n🧪 Testing method: {method_name}")
         
         try:
-            method = getattr(self.client, method_name)
-            sig = inspect.signature(method)
+            if sig is None:
+                sig = inspect.signature(method)
             
             # Analyze method signature to determine how to call it
             params = sig.parameters
             logger.info(f"  📝 Parameters: {list(params.keys())}")
             
-            # Create a message collector for this method
-            messages = []
+            # Running statistics for this method; the messages themselves are not kept
+            message_count = 0
+            first_ts = None
+            last_ts = None
             markets_seen = set()
             data_types = set()
             
             def message_callback(message):
-                nonlocal messages, markets_seen, data_types
-                messages.append({
-                    'timestamp': datetime.now(timezone.utc),
-                    'data': message,
-                    'type': type(message).__name__
-                })
+                nonlocal message_count, first_ts, last_ts
+                message_count += 1
+                last_ts = time.monotonic()
+                if first_ts is None:
+                    first_ts = last_ts
                 
                 # Try to extract market info
-                if hasattr(message, 'market_id'):
-                    markets_seen.add(message.market_id)
-                elif hasattr(message, 'marketId'):
-                    markets_seen.add(message.marketId)
+                market_id = _market_id_of(message)
+                if market_id:
+                    markets_seen.add(market_id)
                 
                 # Track data types
-                data_types.add(type(message).__name__)
+                type_name = type(message).__name__
+                data_types.add(type_name)
                 
-                if len(messages) <= 5:  # Log first few messages
-                    logger.info(f"    📨 Message {len(messages)}: {type(message).__name__}")
+                if message_count <= 5:  # Log first few messages
+                    logger.info("    📨 Message %d: %s", message_count, type_name)
             
             # Determine how to call the method based on its signature
             call_args = self._prepare_method_call(method_name, params)
@@ -129,39 +216,46 @@ class MethodDiscovery:
                 result.error = "Unable to determine method call parameters"
                 return result
             
-            # Add callback to args
+            # Add callbacks to args; a gRPC status error ends the stream, so record it for the report
             call_args['callback'] = message_callback
+            stream_errors = []
+            if 'on_status_callback' in params:
+                call_args['on_status_callback'] = stream_errors.append
             
             logger.info(f"  🚀 Calling {method_name} with args: {list(call_args.keys())}")
             
             # Start the method and wait for messages
-            start_time = datetime.now(timezone.utc)
-            
-            # Create task for the listen method
-            listen_task = asyncio.create_task(method(**call_args))
+            start_ts = time.monotonic()
             
-            # Wait for timeout or completion
+            # The listen call returns once its stream ends; the timeout cancels it in place,
+            # so the gRPC stream is torn down before the block exits
             try:
-                await asyncio.wait_for(listen_task, timeout=timeout)
-            except asyncio.TimeoutError:
+                async with asyncio.timeout(timeout):
+                    await method(**call_args)
+            except TimeoutError:
                 logger.info(f"  ⏰ Method {method_name} timed out after {timeout}s (expected)")
-                listen_task.cancel()
             except Exception as e:
                 logger.warning(f"  ⚠️ Method {method_name} ended with: {e}")
             
-            end_time = datetime.now(timezone.utc)
-            duration = (end_time - start_time).total_seconds()
+            if stream_errors:
+                result.error = str(stream_errors[0])
+                logger.warning(f"  ⚠️ Method {method_name} stream closed with status: {result.error}")
+            
+            end_ts = time.monotonic()
+            duration = end_ts - start_ts
             
             # Analyze results
-            result.success = len(messages) > 0
-            result.message_count = len(messages)
+            result.success = message_count > 0
+            result.message_count = message_count
             result.markets_with_data = markets_seen
             result.data_types_seen = data_types
-            result.message_rate = len(messages) / duration if duration > 0 else 0
+            result.message_rate = message_count / duration if duration > 0 else 0
             
-            if messages:
-                result.first_message_time = messages[0]['timestamp']
-                result.last_message_time = messages[-1]['timestamp']
+            if first_ts is not None:
+                # Map monotonic stamps onto wall-clock time once, for the report
+                now, now_ts = datetime.now(timezone.utc), time.monotonic()
+                result.first_message_time = now - timedelta(seconds=now_ts - first_ts)
+                result.last_message_time = now - timedelta(seconds=now_ts - last_ts)
             
             logger.info(f"  📊 Results: {result.message_count} messages, {len(markets_seen)} markets, rate: {result.message_rate:.2f} msg/s")
             
@@ -172,7 +266,11 @@ class MethodDiscovery:
         return result
     
     def _prepare_method_call(self, method_name: str, params: Dict) -> Optional[Dict[str, Any]]:
-        """Prepare method call arguments based on method signature"""
+        """Prepare method call arguments from the call-spec table, or from the method signature"""
+        builder = _CALL_SPECS.get(method_name)
+        if builder is not None:
+            return builder(self.test_markets)
+        
         args = {}
         
         # Common parameter mappings
@@ -190,22 +288,6 @@ class MethodDiscovery:
         elif 'market_id' in param_names:
             args['market_id'] = self.test_markets[0]  # Single market for methods that don't support multiple
         
-        # Handle other common parameters
-        if 'subaccount_id' in param_names:
-            # Skip methods that require subaccount_id for now
-            logger.info(f"  ⏩ Skipping {method_name} - requires subaccount_id")
-            return None
-        
-        if 'order_side' in param_names:
-            # Skip methods that require specific order side
-            logger.info(f"  ⏩ Skipping {method_name} - requires order_side")
-            return None
-        
-        if 'execution_side' in param_names:
-            # Skip methods that require execution side
-            logger.info(f"  ⏩ Skipping {method_name} - requires execution_side")
-            return None
-        
         # Note: 'callback' will be added by the caller
         
         return args
@@ -218,22 +300,24 @@ class MethodDiscovery:
         if not await self.initialize_client():
             return {}
         
-        # Discover all methods
+        # Discover the methods that can be probed without an account
         methods = self.discover_listen_methods()
         
         if not methods:
             logger.error("❌ No listen methods found")
             return {}
         
-        # Test each method
+        # Test the methods concurrently, capping how many streams are open at once
         logger.info(f"\n🧪 Testing {len(methods)} methods...")
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_STREAMS)
         
-        for method_name in sorted(methods):
-            result = await self.test_method(method_name)
-            self.results[method_name] = result
-            
-            # Brief pause between tests
-            await asyncio.sleep(2)
+        async def test_limited(method_name: str, sig: Optional[inspect.Signature],
+                               method: Callable) -> MethodResult:
+            async with semaphore:
+                return await self.test_method(method_name, sig, method)
+        
+        results = await asyncio.gather(*(test_limited(*entry) for entry in methods))
+        self.results.update((result.method_name, result) for result in results)
         
         # Generate report
         self._generate_report()
@@ -246,18 +330,20 @@ class MethodDiscovery:
         logger.info("📊 INJECTIVE LISTEN METHODS DISCOVERY REPORT")
         logger.info("="*80)
         
-        successful_methods = [r for r in self.results.values() if r.success]
-        failed_methods = [r for r in self.results.values() if not r.success]
+        successful_methods = []
+        failed_methods = []
+        for result in self.results.values():
+            (successful_methods if result.success else failed_methods).append(result)
         
         logger.info(f"✅ Successful methods: {len(successful_methods)}")
         logger.info(f"❌ Failed methods: {len(failed_methods)}")
         
         if successful_methods:
             logger.info("\n🏆 TOP PERFORMING METHODS:")
-            # Sort by message rate
-            top_methods = sorted(successful_methods, key=lambda x: x.message_rate, reverse=True)
+            # Ten highest message rates, best first
+            top_methods = heapq.nlargest(10, successful_methods, key=_by_message_rate)
             
-            for i, result in enumerate(top_methods[:10], 1):
+            for i, result in enumerate(top_methods, 1):
                 logger.info(f"  {i}. {result.method_name}")
                 logger.info(f"     💬 {result.message_count} messages ({result.message_rate:.2f} msg/s)")
                 logger.info(f"     🏪 {len(result.markets_with_data)} markets with data")
@@ -270,13 +356,13 @@ class MethodDiscovery:
         
         logger.info("\n🎯 RECOMMENDATIONS:")
         if successful_methods:
-            best_method = max(successful_methods, key=lambda x: x.message_rate)
+            best_method = top_methods[0]
             logger.info(f"  🥇 Best overall: {best_method.method_name} ({best_method.message_rate:.2f} msg/s)")
             
             # Find methods that support multiple markets
             multi_market_methods = [r for r in successful_methods if len(r.markets_with_data) > 1]
             if multi_market_methods:
-                best_multi = max(multi_market_methods, key=lambda x: x.message_rate)
+                best_multi = max(multi_market_methods, key=_by_message_rate)
                 logger.info(f"  🏪 Best multi-market: {best_multi.method_name} ({len(best_multi.markets_with_data)} markets)")
         
         logger.info("="*80)
@@ -287,7 +373,6 @@ async def main():
     results = await discovery.run_discovery()
     
     # Save results to file for analysis
-    import json
     report_data = {}
     for method_name, result in results.items():
         report_data[method_name] = {
@@ -299,10 +384,9 @@ async def main():
             'error': result.error
         }
     
-    with open('injective_methods_discovery.json', 'w') as f:
-        json.dump(report_data, f, indent=2)
+    write_json('injective_methods_discovery.json', report_data)
     
     logger.info("\n💾 Results saved to injective_methods_discovery.json")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run(main())
@@ -6,13 +6,17 @@ the highest volume USDT pairs for testing our multiple market subscription fix.
 """
 
 import asyncio
+import heapq
 import logging
+import operator
+from dataclasses import dataclass
 from typing import List, Dict, Any, Optional
 from pyinjective.async_client import AsyncClient
 from pyinjective.core.network import Network
-import json
 from datetime import datetime, timedelta
 
+from src.injective_bot.connection.network_utils import cached_fetch, run, write_json
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -20,12 +24,46 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Most market summary requests in flight at once, to stay clear of RPC throttling
+MAX_CONCURRENT_SUMMARIES = 20
+
+# Seconds a fetched market list or market summary is served from cache
+CACHE_TTL = 30.0
+
+# Market report layout: a fixed header, then one block per market
+_REPORT_HEADER = "\n" + "="*80 + "\n" + "📊 TOP PERPETUAL USDT MARKETS BY 24H VOLUME\n" + "="*80 + "\n"
+_MARKET_BLOCK = (
+    "\n{rank:2d}. {m.ticker:20s}\n"
+    "    Market ID: {m.market_id}\n"
+    "    Base/Quote: {m.base_token}/{m.quote_token}\n"
+    "    24h Volume: ${m.volume_24h:>15,.2f}\n"
+    "    Price: ${m.price:>20,.6f}\n"
+    "    Status: {m.market_status}\n"
+    "    " + "-"*50 + "\n"
+)
+
+@dataclass(slots=True)
+class MarketInfo:
+    """A USDT perpetual market with its 24h volume and last price"""
+    market_id: str
+    ticker: str
+    base_token: str
+    quote_token: str
+    market_status: str
+    perpetual_market_info: Any
+    volume_24h: float = 0.0  # Filled from the market summary
+    price: float = 0.0       # Filled from the market summary
+
+# Ranking key for analyzed markets
+_by_volume = operator.attrgetter('volume_24h')
+
 class PerpetualMarketAnalyzer:
     """Analyze and fetch perpetual markets data from Injective Protocol"""
     
     def __init__(self, network: str = "mainnet"):
         self.network = Network.mainnet() if network == "mainnet" else Network.testnet()
         self.client = None
+        self._summary_limit = asyncio.Semaphore(MAX_CONCURRENT_SUMMARIES)
         
     async def initialize(self) -> bool:
         """Initialize the Injective client"""
@@ -38,10 +76,14 @@ class PerpetualMarketAnalyzer:
             return False
             
     async def fetch_derivative_markets(self) -> List[Dict[str, Any]]:
-        """Fetch all derivative markets from Injective"""
+        """Fetch all derivative markets from Injective (cached for CACHE_TTL seconds)"""
         try:
             logger.info("📊 Fetching derivative markets...")
-            markets_response = await self.client.fetch_derivative_markets()
+            markets_response = await cached_fetch(
+                ('derivative_markets', self.network.grpc_exchange_endpoint),
+                CACHE_TTL,
+                self.client.fetch_derivative_markets,
+            )
             
             if hasattr(markets_response, 'markets'):
                 markets = markets_response.markets
@@ -56,109 +98,150 @@ class PerpetualMarketAnalyzer:
             return []
     
     async def fetch_market_summary(self, market_id: str) -> Optional[Dict[str, Any]]:
-        """Fetch market summary for volume analysis"""
+        """Fetch market summary for volume analysis (cached for CACHE_TTL seconds)"""
+        async def fetch() -> Any:
+            async with self._summary_limit:
+                return await self.client.fetch_derivative_market_summary(market_id=market_id)
+        
         try:
-            summary_response = await self.client.fetch_derivative_market_summary(market_id=market_id)
-            return summary_response
+            return await cached_fetch(
+                ('derivative_market_summary', self.network.grpc_exchange_endpoint, market_id), CACHE_TTL, fetch
+            )
         except Exception as e:
             logger.debug(f"Could not fetch summary for market {market_id}: {e}")
             return None
     
-    async def analyze_perpetual_markets(self) -> List[Dict[str, Any]]:
-        """Analyze perpetual markets and return sorted by volume"""
+    async def fetch_market_summaries(self) -> Dict[str, Any]:
+        """Fetch every derivative market summary in one request, keyed by market ID"""
+        fetch_all = getattr(self.client, 'fetch_derivative_market_summaries', None)
+        if fetch_all is None:
+            # Not every injective-py release exposes the bulk call
+            return {}
+        try:
+            response = await fetch_all()
+        except Exception as e:
+            logger.debug(f"Could not fetch market summaries: {e}")
+            return {}
+        
+        summaries = getattr(response, 'summaries', None)
+        if summaries is None and isinstance(response, dict):
+            summaries = response.get('summaries', [])
+        
+        by_market = {}
+        for summary in summaries or []:
+            market_id = getattr(summary, 'market_id', None)
+            if market_id is None and isinstance(summary, dict):
+                market_id = summary.get('marketId') or summary.get('market_id')
+            if market_id:
+                by_market[market_id] = summary
+        return by_market
+    
+    async def analyze_perpetual_markets(self) -> List[MarketInfo]:
+        """Analyze perpetual markets and return the active USDT perpetuals, in market list order"""
         markets = await self.fetch_derivative_markets()
         if not markets:
             return []
         
-        perpetual_usdt_markets = []
+        candidates = []
         
         logger.info("🔍 Analyzing markets for USDT perpetuals...")
         
         for market in markets:
             try:
                 # Extract market information
-                market_info = {
-                    'market_id': market.market_id,
-                    'ticker': market.ticker,
-                    'base_token': getattr(market, 'base_token', {}).get('symbol', 'Unknown'),
-                    'quote_token': getattr(market, 'quote_token', {}).get('symbol', 'Unknown'),
-                    'market_status': market.market_status,
-                    'perpetual_market_info': getattr(market, 'perpetual_market_info', None),
-                    'volume_24h': 0,  # Will be filled from market summary
-                    'price': 0,       # Will be filled from market summary
-                }
+                market_info = MarketInfo(
+                    market_id=market.market_id,
+                    ticker=market.ticker,
+                    base_token=getattr(market, 'base_token', {}).get('symbol', 'Unknown'),
+                    quote_token=getattr(market, 'quote_token', {}).get('symbol', 'Unknown'),
+                    market_status=market.market_status,
+                    perpetual_market_info=getattr(market, 'perpetual_market_info', None),
+                )
                 
                 # Filter for USDT perpetuals
-                if (market_info['quote_token'] == 'USDT' and 
-                    market_info['perpetual_market_info'] is not None and
-                    market_info['market_status'] == 'active'):
-                    
-                    # Fetch market summary for volume data
-                    summary = await self.fetch_market_summary(market.market_id)
-                    if summary:
-                        market_info['volume_24h'] = float(getattr(summary, 'volume', 0))
-                        market_info['price'] = float(getattr(summary, 'price', 0))
-                    
-                    perpetual_usdt_markets.append(market_info)
-                    logger.info(f"✅ Found perpetual: {market_info['ticker']} (Volume: ${market_info['volume_24h']:,.2f})")
+                if (market_info.quote_token == 'USDT' and 
+                    market_info.perpetual_market_info is not None and
+                    market_info.market_status == 'active'):
+                    candidates.append(market_info)
                     
             except Exception as e:
-                logger.debug(f"Error processing market {getattr(market, 'market_id', 'unknown')}: {e}")
+                logger.debug("Error processing market %s: %s", getattr(market, 'market_id', 'unknown'), e)
                 continue
         
-        # Sort by 24h volume (descending)
-        perpetual_usdt_markets.sort(key=lambda x: x['volume_24h'], reverse=True)
+        # One bulk request covers most markets; the rest are fetched individually, concurrently
+        bulk_summaries = await self.fetch_market_summaries() if candidates else {}
+        missing = [market_info.market_id for market_info in candidates
+                   if market_info.market_id not in bulk_summaries]
+        fetched = await asyncio.gather(
+            *(self.fetch_market_summary(market_id) for market_id in missing),
+            return_exceptions=True
+        )
+        bulk_summaries.update(zip(missing, fetched))
+        summaries = [bulk_summaries[market_info.market_id] for market_info in candidates]
+        
+        perpetual_usdt_markets = []
+        log_found = logger.isEnabledFor(logging.INFO)
+        for market_info, summary in zip(candidates, summaries):
+            try:
+                if summary and not isinstance(summary, BaseException):
+                    market_info.volume_24h = float(getattr(summary, 'volume', 0))
+                    market_info.price = float(getattr(summary, 'price', 0))
+            except Exception as e:
+                logger.debug("Error processing market %s: %s", market_info.market_id, e)
+                continue
+            
+            perpetual_usdt_markets.append(market_info)
+            if log_found:
+                logger.info("✅ Found perpetual: %s (Volume: $%s)", market_info.ticker, f"{market_info.volume_24h:,.2f}")
         
         return perpetual_usdt_markets
     
-    async def get_top_perpetual_markets(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get top perpetual USDT markets by volume"""
+    async def get_top_perpetual_markets(self, limit: int = 10) -> List[MarketInfo]:
+        """Get top perpetual USDT markets by volume, highest first"""
         markets = await self.analyze_perpetual_markets()
-        return markets[:limit]
+        return heapq.nlargest(limit, markets, key=_by_volume)
     
-    def format_market_report(self, markets: List[Dict[str, Any]]) -> str:
+    def format_market_report(self, markets: List[MarketInfo]) -> str:
         """Format markets data into a readable report"""
         if not markets:
             return "❌ No perpetual USDT markets found"
         
-        report = "\n" + "="*80 + "\n"
-        report += "📊 TOP PERPETUAL USDT MARKETS BY 24H VOLUME\n"
-        report += "="*80 + "\n"
-        
-        for i, market in enumerate(markets, 1):
-            report += f"\n{i:2d}. {market['ticker']:20s}\n"
-            report += f"    Market ID: {market['market_id']}\n"
-            report += f"    Base/Quote: {market['base_token']}/{market['quote_token']}\n"
-            report += f"    24h Volume: ${market['volume_24h']:>15,.2f}\n"
-            report += f"    Price: ${market['price']:>20,.6f}\n"
-            report += f"    Status: {market['market_status']}\n"
-            report += "    " + "-"*50 + "\n"
-        
-        return report
+        parts = [_REPORT_HEADER]
+        parts.extend(_MARKET_BLOCK.format(rank=i, m=market) for i, market in enumerate(markets, 1))
+        return "".join(parts)
     
-    async def export_market_ids_for_testing(self, markets: List[Dict[str, Any]], filename: str = "top_perpetual_market_ids.json"):
+    async def export_market_ids_for_testing(self, markets: List[MarketInfo], filename: str = "top_perpetual_market_ids.json"):
         """Export market IDs in format suitable for testing"""
+        # One walk ranks the markets and picks the first BTC and ETH pairs
+        ranked = []
+        btc_usdt_perp = eth_usdt_perp = None
+        for rank, market in enumerate(markets, 1):
+            market_id = market.market_id
+            ticker = market.ticker
+            ranked.append({
+                'market_id': market_id,
+                'ticker': ticker,
+                'volume_24h': market.volume_24h,
+                'rank': rank
+            })
+            if btc_usdt_perp is None and 'BTC' in ticker:
+                btc_usdt_perp = market_id
+            if eth_usdt_perp is None and 'ETH' in ticker:
+                eth_usdt_perp = market_id
+        
         market_data = {
             'timestamp': datetime.now().isoformat(),
-            'top_perpetual_usdt_markets': [
-                {
-                    'market_id': market['market_id'],
-                    'ticker': market['ticker'],
-                    'volume_24h': market['volume_24h'],
-                    'rank': i + 1
-                }
-                for i, market in enumerate(markets)
-            ],
+            'top_perpetual_usdt_markets': ranked,
             'testing_recommendations': {
-                'highest_volume_pair': markets[0]['market_id'] if markets else None,
-                'top_3_for_testing': [m['market_id'] for m in markets[:3]],
-                'btc_usdt_perp': next((m['market_id'] for m in markets if 'BTC' in m['ticker']), None),
-                'eth_usdt_perp': next((m['market_id'] for m in markets if 'ETH' in m['ticker']), None),
+                'highest_volume_pair': markets[0].market_id if markets else None,
+                'top_3_for_testing': [m.market_id for m in markets[:3]],
+                'btc_usdt_perp': btc_usdt_perp,
+                'eth_usdt_perp': eth_usdt_perp,
             }
         }
         
-        with open(filename, 'w') as f:
-            json.dump(market_data, f, indent=2)
+        # Write from a worker thread so the event loop keeps serving requests
+        await asyncio.to_thread(write_json, filename, market_data)
         
         logger.info(f"💾 Market data exported to {filename}")
         return market_data
@@ -201,11 +284,12 @@ async def main():
         print(f"ETH/USDT PERP Market ID: {testing['eth_usdt_perp']}")
     
     print(f"\nTop 3 Markets for Multi-Market Testing:")
+    by_id = {m.market_id: m for m in top_markets}
     for i, market_id in enumerate(testing['top_3_for_testing'], 1):
-        market = next(m for m in top_markets if m['market_id'] == market_id)
-        print(f"{i}. {market['ticker']:15s} - {market_id}")
+        market = by_id[market_id]
+        print(f"{i}. {market.ticker:15s} - {market_id}")
     
     print(f"\n✅ Analysis complete! Found {len(top_markets)} active perpetual USDT markets")
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run(main())
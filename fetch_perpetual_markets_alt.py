@@ -5,11 +5,18 @@ Alternative approach to fetch Injective perpetual markets using REST API
 
 import asyncio
 import aiohttp
-import json
 import logging
-from typing import List, Dict, Any
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:  # orjson is optional - fall back to the stdlib json module
+    orjson = None
+
+from src.injective_bot.connection.network_utils import run, write_json
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -17,76 +24,156 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Injective mainnet API host
+BASE_URL = "https://sentry.chain.grpc-web.injective.network"
+
+# Seconds a successful REST response body is served from cache
+CACHE_TTL = 30.0
+
+# Market fetch attempts, and the deadline for the whole live fetch, before falling back to the known markets
+FETCH_ATTEMPTS = 3
+LIVE_FETCH_TIMEOUT = 15.0
+
+# Peggy-bridged USDT denom and the active market status, as the REST API reports them
+_USDT_PEGGY = "peggy0xdac17f958d2ee523a2206206994597c13d831ec7"
+_ACTIVE = "MARKET_STATUS_ACTIVE"
+_FILTER_KEYS = ('quote_denom', 'market_status', 'perpetual_market_info')
+
+def _is_active_usdt_perpetual(market: Dict) -> bool:
+    """Whether a REST market entry is an active perpetual quoted in USDT"""
+    if not isinstance(market, dict):
+        return False
+    quote_denom, market_status, perpetual_info = map(market.get, _FILTER_KEYS)
+    if market_status != _ACTIVE or perpetual_info is None:
+        return False
+    # The bridged denom covers most markets, so the lowercased copy is rarely needed
+    quote_denom = quote_denom or ''
+    return _USDT_PEGGY in quote_denom or 'usdt' in quote_denom.lower()
+
 class PerpetualMarketFetcher:
-    """Fetch perpetual markets using REST API"""
+    """Fetch perpetual markets using REST API
+    
+    Use as an async context manager; every request shares one pooled HTTP session.
+    """
     
     def __init__(self):
         # Injective mainnet API endpoints
-        self.base_url = "https://sentry.chain.grpc-web.injective.network"
+        self.base_url = BASE_URL
         self.api_endpoints = {
             'derivative_markets': f"{self.base_url}/injective.exchange.v1beta1.Query/DerivativeMarkets",
-            'market_summary': f"{self.base_url}/injective.exchange.v1beta1.Query/DerivativeMarketSummary"
+            'market_summary': f"{self.base_url}/injective.exchange.v1beta1.Query/DerivativeMarketSummary",
+            'latest_block': f"{self.base_url}/cosmos.base.tendermint.v1beta1.Service/GetLatestBlock"
         }
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Decoded REST bodies by (url, headers), as (fetched at, body). Kept per fetcher rather than in
+        # network_utils.cached_fetch so cache_clear() before a retry drops only this session's bodies
+        self._responses: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Tuple[float, Any]] = {}
+        # Outcome of the connectivity probe, once it has run
+        self._accessible: Optional[bool] = None
+    
+    async def __aenter__(self) -> "PerpetualMarketFetcher":
+        # Keep-alive connections and cached DNS lookups are reused across requests to the host
+        connector = aiohttp.TCPConnector(limit=20, limit_per_host=10, ttl_dns_cache=300, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(connector=connector)
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        session, self._session = self._session, None
+        if session is not None:
+            await session.close()
+        
+    def cache_clear(self) -> None:
+        """Drop cached REST responses so the next calls fetch fresh data"""
+        self._responses.clear()
+    
+    async def _get_json(self, url: str, headers: Dict[str, str]) -> Optional[Any]:
+        """GET url and decode its JSON body, reusing a body fetched within CACHE_TTL; None on HTTP errors"""
+        key = (url, tuple(sorted(headers.items())))
+        cached = self._responses.get(key)
+        if cached is not None and time.monotonic() - cached[0] <= CACHE_TTL:
+            return cached[1]
+        
+        async with self._session.get(url, headers=headers) as response:
+            if response.status != 200:
+                logger.error(f"❌ HTTP {response.status}: {await response.text()}")
+                return None
+            if orjson is not None:
+                data = orjson.loads(await response.read())
+            else:
+                data = await response.json()
         
-    async def fetch_derivative_markets_rest(self) -> List[Dict]:
-        """Fetch derivative markets using REST API"""
+        self._responses[key] = (time.monotonic(), data)
+        return data
+        
+    async def fetch_derivative_markets_rest(self, predicate: Optional[Callable[[Dict], bool]] = None) -> List[Dict]:
+        """Fetch derivative markets using REST API, keeping only those matching predicate if given"""
         try:
-            async with aiohttp.ClientSession() as session:
-                logger.info("📊 Fetching derivative markets via REST API...")
-                
-                async with session.get(
-                    self.api_endpoints['derivative_markets'],
-                    headers={'Content-Type': 'application/json'}
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        markets = data.get('markets', [])
-                        logger.info(f"✅ Found {len(markets)} derivative markets")
-                        return markets
-                    else:
-                        logger.error(f"❌ HTTP {response.status}: {await response.text()}")
-                        return []
-                        
+            logger.info("📊 Fetching derivative markets via REST API...")
+            
+            data = await self._get_json(
+                self.api_endpoints['derivative_markets'],
+                headers={'Content-Type': 'application/json'}
+            )
+            if data is None:
+                return []
+            
+            markets = data.get('markets', [])
+            logger.info(f"✅ Found {len(markets)} derivative markets")
+            if predicate is not None:
+                markets = [market for market in markets if predicate(market)]
+            return markets
+                    
         except Exception as e:
             logger.error(f"❌ Error fetching markets via REST: {e}")
             return []
     
+    async def test_market_accessibility(self) -> bool:
+        """Test if we can access market data (probed once per fetcher)"""
+        if self._accessible is None:
+            self._accessible = await self._probe_accessibility()
+        return self._accessible
+    
+    async def _probe_accessibility(self) -> bool:
+        try:
+            # Test basic connectivity to Injective
+            async with self._session.get(self.api_endpoints['latest_block']) as response:
+                if response.status == 200:
+                    logger.info("✅ Injective network is accessible")
+                    return True
+                else:
+                    logger.error(f"❌ Network test failed: {response.status}")
+                    return False
+                    
+        except Exception as e:
+            logger.error(f"❌ Network connectivity test failed: {e}")
+            return False
+    
     async def analyze_perpetual_usdt_markets(self) -> List[Dict]:
         """Analyze and filter perpetual USDT markets"""
-        markets = await self.fetch_derivative_markets_rest()
+        markets = await self.fetch_derivative_markets_rest(predicate=_is_active_usdt_perpetual)
         if not markets:
             return []
         
         perpetual_markets = []
         
-        for market in markets:
-            try:
-                # Check if it's a perpetual market with USDT quote
-                quote_denom = market.get('quote_denom', '')
-                market_status = market.get('market_status', '')
-                perpetual_info = market.get('perpetual_market_info')
+        # Entries already passed the filter, so a failure here is exceptional - not per-market
+        try:
+            for market in markets:
+                market_info = {
+                    'market_id': market.get('market_id', ''),
+                    'ticker': market.get('ticker', ''),
+                    'base_denom': market.get('base_denom', ''),
+                    'quote_denom': market.get('quote_denom', ''),
+                    'market_status': market.get('market_status', ''),
+                    'min_price_tick_size': market.get('min_price_tick_size', '0'),
+                    'min_quantity_tick_size': market.get('min_quantity_tick_size', '0'),
+                }
                 
-                # Filter for USDT perpetuals that are active
-                if (('usdt' in quote_denom.lower() or 'peggy0xdac17f958d2ee523a2206206994597c13d831ec7' in quote_denom) and
-                    perpetual_info is not None and
-                    market_status == 'MARKET_STATUS_ACTIVE'):
-                    
-                    market_info = {
-                        'market_id': market.get('market_id', ''),
-                        'ticker': market.get('ticker', ''),
-                        'base_denom': market.get('base_denom', ''),
-                        'quote_denom': market.get('quote_denom', ''),
-                        'market_status': market_status,
-                        'min_price_tick_size': market.get('min_price_tick_size', '0'),
-                        'min_quantity_tick_size': market.get('min_quantity_tick_size', '0'),
-                    }
-                    
-                    perpetual_markets.append(market_info)
-                    logger.info(f"✅ Found perpetual: {market_info['ticker']}")
-                    
-            except Exception as e:
-                logger.debug(f"Error processing market: {e}")
-                continue
+                perpetual_markets.append(market_info)
+                logger.info("✅ Found perpetual: %s", market_info['ticker'])
+                
+        except Exception as e:
+            logger.debug("Error processing market: %s", e)
         
         return perpetual_markets
 
@@ -118,72 +205,82 @@ async def get_known_perpetual_markets():
     
     return known_markets
 
-async def test_market_accessibility():
-    """Test if we can access market data"""
-    try:
-        async with aiohttp.ClientSession() as session:
-            # Test basic connectivity to Injective
-            test_url = "https://sentry.chain.grpc-web.injective.network/cosmos.base.tendermint.v1beta1.Service/GetLatestBlock"
-            
-            async with session.get(test_url) as response:
-                if response.status == 200:
-                    logger.info("✅ Injective network is accessible")
-                    return True
-                else:
-                    logger.error(f"❌ Network test failed: {response.status}")
-                    return False
-                    
-    except Exception as e:
-        logger.error(f"❌ Network connectivity test failed: {e}")
-        return False
+async def export_known_markets(known_markets: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Print the known perpetual markets and export them for testing"""
+    print("\n" + "="*80)
+    print("📊 KNOWN HIGH-VOLUME PERPETUAL USDT MARKETS")
+    print("="*80)
+    
+    for market in known_markets:
+        print(f"\n{market['priority']}. {market['ticker']}")
+        print(f"   Market ID: {market['market_id']}")
+        print(f"   Description: {market['description']}")
+    
+    # Export for testing
+    export_data = {
+        'timestamp': datetime.now().isoformat(),
+        'source': 'known_markets',
+        'markets': known_markets,
+        'testing_recommendations': {
+            'btc_usdt_perp': known_markets[0]['market_id'],
+            'eth_usdt_perp': known_markets[1]['market_id'],
+            'top_3_for_testing': [m['market_id'] for m in known_markets[:3]]
+        }
+    }
+    
+    await asyncio.to_thread(write_json, 'perpetual_markets_known.json', export_data)
+    
+    print(f"\n💾 Known market data exported to perpetual_markets_known.json")
+    return export_data
+
+async def fetch_live_markets(fetcher: PerpetualMarketFetcher) -> List[Dict]:
+    """Fetch perpetual USDT markets from the API; empty when the network or API is unavailable"""
+    # Test network connectivity first
+    if not await fetcher.test_market_accessibility():
+        logger.warning("⚠️  Network issues detected, using known market IDs...")
+        return []
+    
+    # Try fetching from API, backing off between attempts
+    markets = []
+    for attempt in range(FETCH_ATTEMPTS):
+        markets = await fetcher.analyze_perpetual_usdt_markets()
+        if markets:
+            break
+        if attempt < FETCH_ATTEMPTS - 1:
+            await asyncio.sleep(2 ** attempt)
+            # A retry must hit the API again rather than re-read the cached body
+            fetcher.cache_clear()
+    
+    if not markets:
+        logger.warning("⚠️  API fetch failed, using known markets...")
+    return markets
 
 async def main():
     """Main execution"""
     logger.info("🚀 Fetching Injective Perpetual USDT Markets...")
     
-    # Test network connectivity first
-    if not await test_market_accessibility():
-        logger.warning("⚠️  Network issues detected, using known market IDs...")
-        known_markets = await get_known_perpetual_markets()
-        
-        print("\n" + "="*80)
-        print("📊 KNOWN HIGH-VOLUME PERPETUAL USDT MARKETS")
-        print("="*80)
+    # One pooled HTTP session serves the connectivity probe and the market fetch
+    async with PerpetualMarketFetcher() as fetcher:
+        # The known markets are ready as a fallback while the live fetch runs under its deadline
+        live_task = asyncio.create_task(fetch_live_markets(fetcher))
+        known_task = asyncio.create_task(get_known_perpetual_markets())
         
-        for market in known_markets:
-            print(f"\n{market['priority']}. {market['ticker']}")
-            print(f"   Market ID: {market['market_id']}")
-            print(f"   Description: {market['description']}")
+        done, _ = await asyncio.wait({live_task}, timeout=LIVE_FETCH_TIMEOUT)
+        if live_task in done:
+            markets = live_task.result()
+        else:
+            logger.warning(f"⚠️  Live fetch exceeded {LIVE_FETCH_TIMEOUT}s, using known markets...")
+            live_task.cancel()
+            await asyncio.gather(live_task, return_exceptions=True)
+            markets = []
         
-        # Export for testing
-        export_data = {
-            'timestamp': datetime.now().isoformat(),
-            'source': 'known_markets',
-            'markets': known_markets,
-            'testing_recommendations': {
-                'btc_usdt_perp': known_markets[0]['market_id'],
-                'eth_usdt_perp': known_markets[1]['market_id'],
-                'top_3_for_testing': [m['market_id'] for m in known_markets[:3]]
-            }
-        }
-        
-        with open('perpetual_markets_known.json', 'w') as f:
-            json.dump(export_data, f, indent=2)
-        
-        print(f"\n💾 Known market data exported to perpetual_markets_known.json")
-        return export_data
-    
-    # Try fetching from API
-    fetcher = PerpetualMarketFetcher()
-    markets = await fetcher.analyze_perpetual_usdt_markets()
-    
-    if markets:
-        print(f"\n✅ Successfully fetched {len(markets)} perpetual USDT markets")
-        for i, market in enumerate(markets, 1):
-            print(f"{i}. {market['ticker']} - {market['market_id']}")
-    else:
-        logger.warning("⚠️  API fetch failed, using known markets...")
-        return await main()  # Retry with known markets
+        if markets:
+            known_task.cancel()
+            print(f"\n✅ Successfully fetched {len(markets)} perpetual USDT markets")
+            for i, market in enumerate(markets, 1):
+                print(f"{i}. {market['ticker']} - {market['market_id']}")
+        else:
+            return await export_known_markets(await known_task)
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run(main())
@@ -5,151 +5,219 @@ Focused validation test - try all available network options systematically
 
 import asyncio
 import logging
+import time
+from itertools import islice
 from datetime import datetime, timezone
-import json
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
 
 from pyinjective import AsyncClient
 from pyinjective.core.network import Network
 
+from src.injective_bot.connection.network_utils import close_client, extract_markets, run, write_json
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def test_all_networks():
-    """Test all available network configurations"""
-    
-    # All possible network configurations
-    network_tests = [
-        ("mainnet_default", lambda: Network.mainnet()),
-        ("mainnet_lb", lambda: Network.mainnet(node="lb")),
-        ("testnet_default", lambda: Network.testnet()),
-        ("testnet_lb", lambda: Network.testnet(node="lb")),
-        ("devnet", lambda: Network.devnet()),
-        ("local", lambda: Network.local()),
-    ]
-    
-    results = {}
+# (first call, steady state) RPC timeouts in seconds per network kind; the first call
+# also pays for channel setup, so it gets the longer deadline
+NETWORK_TIMEOUTS: Dict[str, Tuple[float, float]] = {
+    'mainnet': (30.0, 15.0),
+    'testnet': (20.0, 15.0),
+    'devnet': (10.0, 10.0),
+    'local': (5.0, 5.0),
+}
+
+# The subscription test ends once this many callbacks arrived, or after the wait
+CALLBACK_TARGET = 10
+SUBSCRIPTION_WAIT = 10.0
+
+# Smoothed RPC latency per gRPC endpoint; later deadlines stretch to 4x this value
+_latency_avg: Dict[str, float] = {}
+
+def _rpc_timeout(endpoint: str, kind: str, first_call: bool) -> float:
+    """Deadline for the next RPC to an endpoint, from its network kind and observed latency"""
+    first, steady = NETWORK_TIMEOUTS.get(kind, NETWORK_TIMEOUTS['mainnet'])
+    if first_call:
+        return first
+    avg = _latency_avg.get(endpoint)
+    return steady if avg is None else max(steady, 4 * avg)
+
+async def _timed_rpc(endpoint: str, kind: str, call: Awaitable[Any], first_call: bool = False) -> Any:
+    """Await an RPC under an adaptive deadline and fold its latency into the endpoint average"""
+    start = time.monotonic()
+    result = await asyncio.wait_for(call, timeout=_rpc_timeout(endpoint, kind, first_call))
+    elapsed = time.monotonic() - start
+    avg = _latency_avg.get(endpoint)
+    _latency_avg[endpoint] = elapsed if avg is None else 0.8 * avg + 0.2 * elapsed
+    return result
+
+def _market_id_of(market: Any) -> str:
+    """Market id of a protobuf or dict market entry"""
+    if isinstance(market, dict):
+        return market.get('market_id') or market.get('marketId', 'unknown')
+    return market.market_id
+
+# One AsyncClient (and its gRPC channels) per network configuration name
+_clients: Dict[str, AsyncClient] = {}
+
+def _client_for(name: str, network: Network) -> AsyncClient:
+    """Get the shared AsyncClient for a network configuration, creating it on first use"""
+    client = _clients.get(name)
+    if client is None:
+        client = _clients[name] = AsyncClient(network)
+    return client
+
+async def _close_clients() -> None:
+    """Close the gRPC channels of every shared AsyncClient"""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await close_client(client)
+
+async def _probe_network(name: str, network_factory: Callable[[], Network]) -> Optional[Dict[str, Any]]:
+    """Probe connection, market data and a multi-market subscription on one network configuration"""
+    logger.info(f"\\n🔧 Testing {name}...")
     
-    for name, network_factory in network_tests:
-        logger.info(f"\\n🔧 Testing {name}...")
+    try:
+        network = network_factory()
+        logger.info(f"  [{name}] Network created: {network.grpc_endpoint}")
         
+        client = _client_for(name, network)
+        endpoint = network.grpc_endpoint
+        kind = name.partition('_')[0]
+        
+        # Test basic connection
         try:
-            network = network_factory()
-            logger.info(f"  Network created: {network.grpc_endpoint}")
-            
-            client = AsyncClient(network)
+            chain_id = await _timed_rpc(endpoint, kind, client.get_chain_id(), first_call=True)
+            logger.info(f"  ✅ [{name}] Connected! Chain ID: {chain_id}")
             
-            # Test basic connection
+            # Test market data
             try:
-                chain_id = await asyncio.wait_for(client.get_chain_id(), timeout=10.0)
-                logger.info(f"  ✅ Connected! Chain ID: {chain_id}")
+                spot_markets = await _timed_rpc(endpoint, kind, client.fetch_spot_markets())
+                
+                # Normalize the response once; only a count and the first few ids are needed
+                markets = extract_markets(spot_markets)
+                market_count = len(markets)
+                sample_markets = [_market_id_of(m) for m in islice(markets, 3)]
+                
+                logger.info(f"  ✅ [{name}] Markets found: {market_count}")
+                if not sample_markets:
+                    return None
+                
+                logger.info(f"  [{name}] Sample markets: {sample_markets}")
+                    
+                # THIS IS THE KEY TEST: Try multiple market subscription
+                if market_count <= 0:
+                    return {
+                        'success': True,
+                        'chain_id': chain_id,
+                        'market_count': 0,
+                        'subscription_test': False
+                    }
+                
+                logger.info(f"  🎯 [{name}] Testing MULTIPLE MARKET subscription...")
+                
+                callback_count = 0
+                enough = asyncio.Event()
+                def test_callback(data):
+                    nonlocal callback_count
+                    callback_count += 1
+                    if callback_count >= CALLBACK_TARGET:
+                        enough.set()
+                    if logger.isEnabledFor(logging.INFO):
+                        logger.info("    📊 [%s] Callback #%d: %s", name, callback_count, type(data).__name__)
+                
+                # Test our fix: single subscription with multiple markets
+                test_markets = sample_markets[:2]  # Use 2 markets
+                logger.info(f"    [{name}] Subscribing to {len(test_markets)} markets in ONE call...")
                 
-                # Test market data
                 try:
-                    spot_markets = await asyncio.wait_for(client.fetch_spot_markets(), timeout=15.0)
+                    subscription_task = asyncio.create_task(
+                        client.listen_spot_orderbook_updates(
+                            market_ids=test_markets,  # MULTIPLE markets - this is our fix
+                            callback=test_callback
+                        )
+                    )
                     
-                    # Parse markets based on response type
-                    market_count = 0
-                    sample_markets = []
+                    # Wait for data, stopping early once enough callbacks arrived
+                    try:
+                        await asyncio.wait_for(enough.wait(), timeout=SUBSCRIPTION_WAIT)
+                    except asyncio.TimeoutError:
+                        pass
                     
-                    if hasattr(spot_markets, 'markets'):
-                        market_count = len(spot_markets.markets)
-                        sample_markets = [m.market_id for m in spot_markets.markets[:3]]
-                    elif isinstance(spot_markets, dict):
-                        if 'markets' in spot_markets:
-                            market_count = len(spot_markets['markets'])
-                            sample_markets = [m.get('market_id', 'unknown') for m in spot_markets['markets'][:3]]
-                        elif 'market' in spot_markets:
-                            market_count = len(spot_markets['market'])
-                    elif isinstance(spot_markets, list):
-                        market_count = len(spot_markets)
-                        sample_markets = [m.get('market_id', 'unknown') for m in spot_markets[:3]]
+                    subscription_task.cancel()
+                    try:
+                        await subscription_task
+                    except asyncio.CancelledError:
+                        pass
                     
-                    logger.info(f"  ✅ Markets found: {market_count}")
-                    if sample_markets:
-                        logger.info(f"  Sample markets: {sample_markets}")
-                        
-                        # THIS IS THE KEY TEST: Try multiple market subscription
-                        if market_count > 0:
-                            logger.info(f"  🎯 Testing MULTIPLE MARKET subscription...")
-                            
-                            callback_count = 0
-                            def test_callback(data):
-                                nonlocal callback_count
-                                callback_count += 1
-                                logger.info(f"    📊 Callback #{callback_count}: {type(data).__name__}")
-                            
-                            # Test our fix: single subscription with multiple markets
-                            test_markets = sample_markets[:2]  # Use 2 markets
-                            logger.info(f"    Subscribing to {len(test_markets)} markets in ONE call...")
-                            
-                            try:
-                                subscription_task = asyncio.create_task(
-                                    client.listen_spot_orderbook_updates(
-                                        market_ids=test_markets,  # MULTIPLE markets - this is our fix
-                                        callback=test_callback
-                                    )
-                                )
-                                
-                                # Wait for data
-                                await asyncio.sleep(10)
-                                
-                                subscription_task.cancel()
-                                try:
-                                    await subscription_task
-                                except asyncio.CancelledError:
-                                    pass
-                                
-                                logger.info(f"    ✅ Subscription test: {callback_count} callbacks received")
-                                
-                                results[name] = {
-                                    'success': True,
-                                    'chain_id': chain_id,
-                                    'market_count': market_count,
-                                    'subscription_test': callback_count > 0,
-                                    'callbacks': callback_count,
-                                    'fix_validated': callback_count > 0
-                                }
-                                
-                            except Exception as e:
-                                logger.warning(f"    ⚠️ Subscription failed: {e}")
-                                results[name] = {
-                                    'success': True,
-                                    'chain_id': chain_id,
-                                    'market_count': market_count,
-                                    'subscription_test': False,
-                                    'subscription_error': str(e)
-                                }
-                        else:
-                            results[name] = {
-                                'success': True,
-                                'chain_id': chain_id,
-                                'market_count': 0,
-                                'subscription_test': False
-                            }
+                    logger.info(f"    ✅ [{name}] Subscription test: {callback_count} callbacks received")
                     
-                except Exception as e:
-                    logger.warning(f"  ⚠️ Market fetch failed: {e}")
-                    results[name] = {
+                    return {
                         'success': True,
                         'chain_id': chain_id,
-                        'market_error': str(e)
+                        'market_count': market_count,
+                        'subscription_test': callback_count > 0,
+                        'callbacks': callback_count,
+                        'fix_validated': callback_count > 0
                     }
                     
+                except Exception as e:
+                    logger.warning(f"    ⚠️ [{name}] Subscription failed: {e}")
+                    return {
+                        'success': True,
+                        'chain_id': chain_id,
+                        'market_count': market_count,
+                        'subscription_test': False,
+                        'subscription_error': str(e)
+                    }
+                
             except Exception as e:
-                logger.warning(f"  ❌ Connection failed: {e}")
-                results[name] = {
-                    'success': False,
-                    'connection_error': str(e)
+                logger.warning(f"  ⚠️ [{name}] Market fetch failed: {e}")
+                return {
+                    'success': True,
+                    'chain_id': chain_id,
+                    'market_error': str(e)
                 }
                 
         except Exception as e:
-            logger.error(f"  💥 Network setup failed: {e}")
-            results[name] = {
+            logger.warning(f"  ❌ [{name}] Connection failed: {e}")
+            return {
                 'success': False,
-                'setup_error': str(e)
+                'connection_error': str(e)
             }
+            
+    except Exception as e:
+        logger.error(f"  💥 [{name}] Network setup failed: {e}")
+        return {
+            'success': False,
+            'setup_error': str(e)
+        }
+
+async def test_all_networks():
+    """Test all available network configurations"""
+    
+    # All possible network configurations
+    network_tests = [
+        ("mainnet_default", lambda: Network.mainnet()),
+        ("mainnet_lb", lambda: Network.mainnet(node="lb")),
+        ("testnet_default", lambda: Network.testnet()),
+        ("testnet_lb", lambda: Network.testnet(node="lb")),
+        ("devnet", lambda: Network.devnet()),
+        ("local", lambda: Network.local()),
+    ]
+    
+    # The probes are independent, so their timeouts and subscription waits overlap
+    try:
+        probes = await asyncio.gather(*(_probe_network(name, factory) for name, factory in network_tests))
+    finally:
+        await _close_clients()
     
-    return results
+    return {
+        name: result
+        for (name, _), result in zip(network_tests, probes)
+        if result is not None
+    }
 
 async def main():
     print("🔍 SYSTEMATIC NETWORK VALIDATION")
@@ -202,13 +270,12 @@ async def main():
         print("✅ Fix is ready for production use")
         
         # Save successful validation
-        with open('fix_validation_success.json', 'w') as f:
-            json.dump({
-                'timestamp': datetime.now(timezone.utc).isoformat(),
-                'validation_success': True,
-                'working_networks': subscription_working,
-                'all_results': results
-            }, f, indent=2)
+        await asyncio.to_thread(write_json, 'fix_validation_success.json', {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'validation_success': True,
+            'working_networks': subscription_working,
+            'all_results': results
+        })
         
         return True
         
@@ -226,5 +293,5 @@ async def main():
         return False
 
 if __name__ == "__main__":
-    result = asyncio.run(main())
+    result = run(main())
     print(f"\\n🏁 Final Result: {'VALIDATED' if result else 'INFRASTRUCTURE ISSUES'}")
@@ -4,70 +4,106 @@ Get active markets with highest volume for testing and trading
 """
 
 import asyncio
+import functools
+import heapq
 import logging
-from typing import List, Dict, Any
+from typing import Any, Dict, List, Optional, Tuple
 from pyinjective.async_client import AsyncClient
 from pyinjective.core.network import Network
 
+from src.injective_bot.connection.network_utils import (
+    MARKETS_TTL, SUMMARIES_TTL, cached_fetch, close_client, extract_markets, specialize
+)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def get_top_volume_markets(network_name: str = "mainnet", limit: int = 10) -> List[Dict[str, Any]]:
-    """Get markets with highest 24h volume"""
+@functools.lru_cache(maxsize=8)
+def _network(kind: str, node: Optional[str] = None) -> Network:
+    """Build (once) the injective-py Network config for a kind and optional node"""
+    factory = getattr(Network, kind)
+    return factory(node=node) if node else factory()
+
+# Quote tokens of the markets worth ranking
+_USD_QUOTES = frozenset(('USDT', 'USDC', 'USD'))
+
+def _dict_to_info(market: Dict[str, Any]) -> Dict[str, Any]:
+    """Market ID, ticker, tokens and status of a market dict"""
+    return {
+        'market_id': market.get('marketId', market.get('market_id', '')),
+        'ticker': market.get('ticker', ''),
+        'base_token': market.get('baseToken', {}).get('symbol', ''),
+        'quote_token': market.get('quoteToken', {}).get('symbol', ''),
+        'status': market.get('marketStatus', 'unknown')
+    }
+
+def _obj_to_info(market: Any) -> Optional[Dict[str, Any]]:
+    """Market ID, ticker, tokens and status of a market object; None if it has no market ID"""
+    market_id = getattr(market, 'market_id', None)
+    if market_id is None:
+        return None
+    base_token = market.base_token
+    quote_token = market.quote_token
+    return {
+        'market_id': market_id,
+        'ticker': market.ticker,
+        'base_token': base_token.symbol if hasattr(base_token, 'symbol') else str(base_token),
+        'quote_token': quote_token.symbol if hasattr(quote_token, 'symbol') else str(quote_token),
+        'status': getattr(market, 'market_status', 'unknown')
+    }
+
+def _dict_summary_volume(summary: Dict[str, Any]) -> Tuple[Optional[str], float]:
+    """Market ID and 24h volume of a market summary dict"""
+    return summary.get('marketId', summary.get('market_id', '')), float(summary.get('volume', 0))
+
+def _obj_summary_volume(summary: Any) -> Tuple[Optional[str], float]:
+    """Market ID and 24h volume of a market summary object; no ID if it has none"""
+    market_id = getattr(summary, 'market_id', None)
+    if market_id is None:
+        return None, 0.0
+    return market_id, float(summary.volume) if hasattr(summary, 'volume') else 0.0
+
+async def get_top_volume_markets(client: AsyncClient, limit: int = 10) -> List[Dict[str, Any]]:
+    """Get markets with highest 24h volume from the network the client is connected to"""
     
+    network_name = client.network.string()
     try:
-        network = Network.mainnet() if network_name == "mainnet" else Network.testnet()
-        client = AsyncClient(network)
-        
-        # Get spot markets
-        markets_response = await client.fetch_spot_markets()
-        logger.info(f"Fetched markets from {network_name}")
-        
-        # Handle response format
-        if isinstance(markets_response, dict) and 'markets' in markets_response:
-            markets = markets_response['markets']
-        else:
-            markets = markets_response
+        # Get spot markets and their summaries together; a failed summaries request only costs the ranking
+        endpoint = client.network.grpc_exchange_endpoint
+        markets_response, market_summaries = await asyncio.gather(
+            cached_fetch(('spot_markets', endpoint), MARKETS_TTL, lambda: client.fetch_spot_markets()),
+            cached_fetch(('spot_market_summaries', endpoint), SUMMARIES_TTL, lambda: client.fetch_spot_market_summaries()),
+            return_exceptions=True
+        )
+        if isinstance(markets_response, BaseException):
+            raise markets_response
+        logger.info("Fetched markets from %s", network_name)
+        
+        markets = extract_markets(markets_response)
             
         # Convert to list of dicts for easier processing
         market_data = []
+        to_info, markets = specialize(markets, _dict_to_info, _obj_to_info)
         for market in markets:
             try:
-                # Handle different market object types
-                if hasattr(market, 'market_id'):
-                    market_info = {
-                        'market_id': market.market_id,
-                        'ticker': market.ticker,
-                        'base_token': market.base_token.symbol if hasattr(market.base_token, 'symbol') else str(market.base_token),
-                        'quote_token': market.quote_token.symbol if hasattr(market.quote_token, 'symbol') else str(market.quote_token),
-                        'status': market.market_status if hasattr(market, 'market_status') else 'unknown'
-                    }
-                elif isinstance(market, dict):
-                    market_info = {
-                        'market_id': market.get('marketId', market.get('market_id', '')),
-                        'ticker': market.get('ticker', ''),
-                        'base_token': market.get('baseToken', {}).get('symbol', ''),
-                        'quote_token': market.get('quoteToken', {}).get('symbol', ''),
-                        'status': market.get('marketStatus', 'unknown')
-                    }
-                else:
-                    continue
-                    
-                # Only include USD pairs that are active
-                if (market_info['quote_token'] in ['USDT', 'USDC', 'USD'] and 
-                    market_info['status'] == 'active'):
-                    market_data.append(market_info)
-                    
+                market_info = to_info(market)
             except Exception as e:
-                logger.debug(f"Error processing market: {e}")
+                logger.debug("Error processing market: %s", e)
                 continue
+            
+            # Only include USD pairs that are active
+            if (market_info is None or
+                market_info['quote_token'] not in _USD_QUOTES or
+                market_info['status'] != 'active'):
+                continue
+            market_data.append(market_info)
         
-        logger.info(f"Found {len(market_data)} active USD markets")
+        logger.info("Found %d active USD markets", len(market_data))
         
         # Try to get volume data for ranking
         try:
-            # Get market summaries for volume data
-            market_summaries = await client.fetch_spot_market_summaries()
+            if isinstance(market_summaries, BaseException):
+                raise market_summaries
             
             # Create volume lookup
             volume_lookup = {}
@@ -76,48 +112,41 @@ async def get_top_volume_markets(network_name: str = "mainnet", limit: int = 10)
             else:
                 summaries = market_summaries
                 
+            to_volume, summaries = specialize(summaries, _dict_summary_volume, _obj_summary_volume)
             for summary in summaries:
                 try:
-                    if hasattr(summary, 'market_id'):
-                        market_id = summary.market_id
-                        volume = float(summary.volume) if hasattr(summary, 'volume') else 0.0
-                    elif isinstance(summary, dict):
-                        market_id = summary.get('marketId', summary.get('market_id', ''))
-                        volume = float(summary.get('volume', 0))
-                    else:
+                    market_id, volume = to_volume(summary)
+                    if market_id is None:
                         continue
-                        
                     volume_lookup[market_id] = volume
                 except Exception as e:
-                    logger.debug(f"Error processing market summary: {e}")
+                    logger.debug("Error processing market summary: %s", e)
                     continue
             
             # Add volume data to markets
             for market in market_data:
                 market['volume_24h'] = volume_lookup.get(market['market_id'], 0.0)
             
-            # Sort by volume (descending)
-            market_data.sort(key=lambda x: x['volume_24h'], reverse=True)
-            
         except Exception as e:
-            logger.warning(f"Could not fetch volume data: {e}")
+            logger.warning("Could not fetch volume data: %s", e)
             # If volume data unavailable, just return the markets
         
-        # Return top markets
-        top_markets = market_data[:limit]
+        # Return top markets by volume; without volume data they keep their listed order
+        top_markets = heapq.nlargest(limit, market_data, key=lambda x: x.get('volume_24h', 0.0))
         
-        logger.info(f"Top {len(top_markets)} volume markets:")
-        for i, market in enumerate(top_markets, 1):
-            volume = market.get('volume_24h', 0)
-            logger.info(f"  {i}. {market['ticker']} ({market['market_id'][:16]}...) - Volume: ${volume:,.0f}")
+        logger.info("Top %d volume markets:", len(top_markets))
+        if logger.isEnabledFor(logging.INFO):
+            for i, market in enumerate(top_markets, 1):
+                logger.info("  %d. %s (%.16s...) - Volume: $%s",
+                            i, market['ticker'], market['market_id'], f"{market.get('volume_24h', 0):,.0f}")
         
         return top_markets
         
     except Exception as e:
-        logger.error(f"Error fetching markets from {network_name}: {e}")
+        logger.error("Error fetching markets from %s: %s", network_name, e)
         return []
 
-async def test_top_markets_subscription(top_markets: List[Dict[str, Any]], test_count: int = 3):
+async def test_top_markets_subscription(client: AsyncClient, top_markets: List[Dict[str, Any]], test_count: int = 3):
     """Test subscription on top volume markets"""
     
     if not top_markets:
@@ -127,20 +156,18 @@ async def test_top_markets_subscription(top_markets: List[Dict[str, Any]], test_
     test_markets = top_markets[:test_count]
     market_ids = [m['market_id'] for m in test_markets]
     
-    logger.info(f"\n🧪 Testing subscription on top {test_count} volume markets:")
-    for market in test_markets:
-        logger.info(f"  - {market['ticker']} (Volume: ${market.get('volume_24h', 0):,.0f})")
+    logger.info("\n🧪 Testing subscription on top %d volume markets:", test_count)
+    if logger.isEnabledFor(logging.INFO):
+        for market in test_markets:
+            logger.info("  - %s (Volume: $%s)", market['ticker'], f"{market.get('volume_24h', 0):,.0f}")
     
     try:
-        network = Network.mainnet()
-        client = AsyncClient(network)
-        
         message_count = 0
         
         def test_callback(data):
             nonlocal message_count
             message_count += 1
-            logger.info(f"📨 Message #{message_count}: {type(data)}")
+            logger.info("📨 Message #%d: %s", message_count, type(data))
         
         # Test orderbook subscription
         task = asyncio.create_task(
@@ -150,7 +177,7 @@ async def test_top_markets_subscription(top_markets: List[Dict[str, Any]], test_
             )
         )
         
-        logger.info(f"⏰ Testing for 15 seconds...")
+        logger.info("⏰ Testing for 15 seconds...")
         await asyncio.sleep(15)
         
         task.cancel()
@@ -159,27 +186,37 @@ async def test_top_markets_subscription(top_markets: List[Dict[str, Any]], test_
         except asyncio.CancelledError:
             pass
         
-        logger.info(f"✅ Result: {message_count} messages received")
-        logger.info(f"   Success rate: {message_count/15:.1f} msg/sec")
+        logger.info("✅ Result: %d messages received", message_count)
+        logger.info("   Success rate: %.1f msg/sec", message_count / 15)
         
         return message_count > 0
         
     except Exception as e:
-        logger.error(f"Error testing markets: {e}")
+        logger.error("Error testing markets: %s", e)
         return False
 
 async def main():
     """Main function to get active markets and test them"""
     
+    # One client serves both the market lookup and the subscription test
+    client = AsyncClient(_network("mainnet"))
+    try:
+        return await _run(client)
+    finally:
+        await close_client(client)
+
+async def _run(client: AsyncClient):
+    """Rank mainnet markets by volume and test a subscription on the top ones"""
+    
     # Get top volume markets from mainnet
-    top_markets = await get_top_volume_markets("mainnet", limit=10)
+    top_markets = await get_top_volume_markets(client, limit=10)
     
     if not top_markets:
         logger.error("❌ No active markets found")
         return
     
     # Test subscription on top markets
-    success = await test_top_markets_subscription(top_markets, test_count=3)
+    success = await test_top_markets_subscription(client, top_markets, test_count=3)
     
     if success:
         logger.info("\n✅ SUCCESS: Market subscription working with high-volume markets")
@@ -189,7 +226,7 @@ async def main():
         logger.info("\n📋 Top 5 market IDs for tests:")
         for i, market_id in enumerate(top_market_ids, 1):
             ticker = top_markets[i-1]['ticker']
-            logger.info(f"  {i}. {ticker}: {market_id}")
+            logger.info("  %d. %s: %s", i, ticker, market_id)
             
         return top_markets
     else:
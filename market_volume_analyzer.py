@@ -4,42 +4,156 @@ Market Volume Analyzer - Fetches and ranks Injective markets by trading volume
 """
 
 import asyncio
+import functools
+import heapq
 import logging
-from typing import List, Dict, Any, Optional, Tuple
-from decimal import Decimal
+import operator
+from typing import Any, Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime, timezone
 
+import numpy as np
 from pyinjective.async_client import AsyncClient
 from pyinjective.core.network import Network
 
+from src.injective_bot.connection.network_utils import MARKETS_TTL, SUMMARIES_TTL, cached_fetch, close_client, specialize
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MarketInfo:
     """Market information with volume metrics"""
     market_id: str
     ticker: str
     base_token: str
     quote_token: str
-    volume_24h: Decimal
-    volume_7d: Decimal
-    price_change_24h: Decimal
+    volume_24h: float
+    volume_7d: float
+    price_change_24h: float
     market_status: str
     is_active: bool
 
+# Most market summary requests in flight at once, to stay clear of RPC throttling
+MAX_CONCURRENT_SUMMARIES = 32
+
+# Ranking key for markets by 24h volume
+_by_volume = operator.attrgetter('volume_24h')
+
+# Market count from which volume ranking is done in NumPy rather than with heapq
+VECTORIZED_RANKING_MIN = 512
+
+# Volume and change figures for markets without a summary
+_NO_VOLUME = (0.0, 0.0, 0.0)
+
+def _dict_summary_figures(summary: Dict[str, Any]) -> Tuple[Optional[str], Tuple[float, float, float]]:
+    """Market ID and (24h volume, 7d volume, 24h change) of a spot market summary dict"""
+    market_id = summary.get('marketId') or summary.get('market_id')
+    fields = (summary.get('volume'), summary.get('volume_7d'), summary.get('change_24h', summary.get('change')))
+    return market_id, tuple(float(value or 0.0) for value in fields)
+
+def _obj_summary_figures(summary: Any) -> Tuple[Optional[str], Tuple[float, float, float]]:
+    """Market ID and (24h volume, 7d volume, 24h change) of a spot market summary object"""
+    market_id = getattr(summary, 'market_id', None)
+    fields = (getattr(summary, 'volume', None), getattr(summary, 'volume_7d', None), getattr(summary, 'change_24h', None))
+    return market_id, tuple(float(value or 0.0) for value in fields)
+
+def _dict_market_fields(market: Dict[str, Any]) -> Tuple[str, str, str, str, str]:
+    """Market ID, ticker, base and quote symbols and status of a spot market dict"""
+    return (
+        market.get('market_id', ''),
+        market.get('ticker', 'UNKNOWN'),
+        market.get('base_denom', 'UNKNOWN'),
+        market.get('quote_denom', 'UNKNOWN'),
+        market.get('market_status', 'active'),
+    )
+
+def _obj_market_fields(market: Any) -> Optional[Tuple[str, str, str, str, str]]:
+    """Market ID, ticker, base and quote symbols and status of a spot market object; None without an ID or ticker"""
+    ticker = getattr(market, 'ticker', None)
+    market_id = getattr(market, 'market_id', None)
+    if ticker is None or market_id is None:
+        return None
+    return (
+        market_id,
+        ticker,
+        getattr(getattr(market, 'base_token', None), 'symbol', 'UNKNOWN'),
+        getattr(getattr(market, 'quote_token', None), 'symbol', 'UNKNOWN'),
+        getattr(market, 'market_status', 'active'),
+    )
+
+@dataclass(slots=True)
+class ActivityCounts:
+    """Stream message counts shared with the activity callback without nonlocal cells"""
+    messages: int = 0
+    orderbook: int = 0
+    trades: int = 0
+
+@functools.lru_cache(maxsize=64)
+def _update_kind(names: Tuple[str, ...]) -> Optional[str]:
+    """'orderbook' or 'trade' for a stream message with these top-level keys or type name, else None"""
+    lowered = ' '.join(names).lower()
+    if 'orderbook' in lowered:
+        return 'orderbook'
+    if 'trade' in lowered:
+        return 'trade'
+    return None
+
 class MarketVolumeAnalyzer:
     """Analyzes and ranks Injective markets by trading volume"""
     
     def __init__(self, network: str = "mainnet"):
         self.network = Network.mainnet() if network == "mainnet" else Network.testnet()
         self.client = AsyncClient(self.network)
+        self._summary_limit = asyncio.Semaphore(MAX_CONCURRENT_SUMMARIES)
         
+    async def __aenter__(self) -> "MarketVolumeAnalyzer":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.aclose()
+    
+    async def aclose(self) -> None:
+        """Close the client's gRPC channels"""
+        await close_client(self.client)
+        
+    async def _fetch_volume_lookup(self) -> Dict[str, Tuple[float, float, float]]:
+        """Fetch every spot market summary in one request, as figures keyed by market ID"""
+        fetch_all = getattr(self.client, 'fetch_spot_market_summaries', None)
+        if fetch_all is None:
+            # Not every injective-py release exposes the bulk call
+            return {}
+        try:
+            response = await cached_fetch(
+                ('spot_market_summaries', self.network.grpc_exchange_endpoint), SUMMARIES_TTL, fetch_all
+            )
+        except Exception as e:
+            logger.debug("Could not fetch market summaries: %s", e)
+            return {}
+        
+        if isinstance(response, dict):
+            summaries = response.get('market_summaries') or response.get('marketSummaries') or []
+        else:
+            summaries = getattr(response, 'market_summaries', response)
+        
+        volume_lookup = {}
+        to_figures, summaries = specialize(summaries or (), _dict_summary_figures, _obj_summary_figures)
+        for summary in summaries:
+            try:
+                market_id, figures = to_figures(summary)
+            except (TypeError, ValueError) as e:
+                logger.debug("Error processing market summary: %s", e)
+                continue
+            if market_id:
+                volume_lookup[market_id] = figures
+        return volume_lookup
+    
     async def fetch_all_spot_markets(self) -> List[MarketInfo]:
         """Fetch all spot markets with volume data"""
         try:
-            markets_response = await self.client.fetch_spot_markets()
+            markets_response = await cached_fetch(
+                ('spot_markets', self.network.grpc_exchange_endpoint), MARKETS_TTL, self.client.fetch_spot_markets
+            )
             
             if hasattr(markets_response, 'markets'):
                 markets = markets_response.markets
@@ -48,66 +162,71 @@ class MarketVolumeAnalyzer:
             elif isinstance(markets_response, list):
                 markets = markets_response
             else:
-                logger.error(f"Unknown markets response format: {type(markets_response)}")
+                logger.error("Unknown markets response format: %s", type(markets_response))
                 return []
                 
-            market_infos = []
-            
+            # Pass 1: pick out the USD markets
+            candidates = []
+            to_fields, markets = specialize(markets, _dict_market_fields, _obj_market_fields)
             for market in markets:
-                try:
-                    # Handle different market object types
-                    if hasattr(market, 'ticker'):
-                        ticker = market.ticker
-                        market_id = market.market_id
-                        base_symbol = market.base_token.symbol if hasattr(market, 'base_token') else 'UNKNOWN'
-                        quote_symbol = market.quote_token.symbol if hasattr(market, 'quote_token') else 'UNKNOWN'
-                        status = market.market_status if hasattr(market, 'market_status') else 'active'
-                    elif isinstance(market, dict):
-                        ticker = market.get('ticker', 'UNKNOWN')
-                        market_id = market.get('market_id', '')
-                        base_symbol = market.get('base_denom', 'UNKNOWN')
-                        quote_symbol = market.get('quote_denom', 'UNKNOWN')
-                        status = market.get('market_status', 'active')
-                    else:
-                        logger.warning(f"Unknown market object type: {type(market)}")
-                        continue
-                    
-                    # Only include USD pairs for our trading focus
-                    if not ticker.endswith('/USD') and 'USD' not in quote_symbol:
-                        continue
-                        
-                    # Get market summary for volume data
-                    summary = await self._get_market_summary(market_id)
-                    
-                    market_info = MarketInfo(
-                        market_id=market_id,
-                        ticker=ticker,
-                        base_token=base_symbol,
-                        quote_token=quote_symbol,
-                        volume_24h=Decimal(str(summary.get('volume', '0'))),
-                        volume_7d=Decimal(str(summary.get('volume_7d', '0'))),
-                        price_change_24h=Decimal(str(summary.get('change_24h', '0'))),
-                        market_status=status,
-                        is_active=status == 'active'
-                    )
-                    
-                    market_infos.append(market_info)
-                    
-                except Exception as e:
-                    logger.warning(f"Error processing market {market.ticker}: {e}")
+                fields = to_fields(market)
+                if fields is None:
+                    logger.warning("Skipping unrecognized market %r", market)
+                    continue
+                
+                # Only include USD pairs for our trading focus
+                ticker, quote_symbol = fields[1], fields[3]
+                if not ticker.endswith('/USD') and 'USD' not in quote_symbol:
                     continue
-                    
+                
+                candidates.append(fields)
+            
+            # Pass 2: one bulk request covers most markets; the rest are fetched individually, concurrently
+            volume_lookup = await self._fetch_volume_lookup() if candidates else {}
+            missing = [candidate[0] for candidate in candidates if candidate[0] not in volume_lookup]
+            summaries = await asyncio.gather(
+                *(self._get_market_summary(market_id) for market_id in missing),
+                return_exceptions=True
+            )
+            
+            # Pass 3: merge the individual summaries, then build the market records
+            for market_id, summary in zip(missing, summaries):
+                try:
+                    if not isinstance(summary, BaseException):
+                        volume_lookup[market_id] = _dict_summary_figures(summary)[1]
+                except (TypeError, ValueError) as e:
+                    logger.debug("Error processing summary for %s: %s", market_id, e)
+            
+            market_infos = []
+            for market_id, ticker, base_symbol, quote_symbol, status in candidates:
+                volume_24h, volume_7d, price_change_24h = volume_lookup.get(market_id, _NO_VOLUME)
+                market_infos.append(MarketInfo(
+                    market_id=market_id,
+                    ticker=ticker,
+                    base_token=base_symbol,
+                    quote_token=quote_symbol,
+                    volume_24h=volume_24h,
+                    volume_7d=volume_7d,
+                    price_change_24h=price_change_24h,
+                    market_status=status,
+                    is_active=status == 'active'
+                ))
+            
             return market_infos
             
         except Exception as e:
-            logger.error(f"Error fetching markets: {e}")
+            logger.error("Error fetching markets: %s", e)
             return []
     
     async def _get_market_summary(self, market_id: str) -> Dict[str, Any]:
         """Get market summary including volume data"""
         try:
             # Try to get market summary
-            summary_response = await self.client.fetch_spot_market_summary(market_id=market_id)
+            async with self._summary_limit:
+                summary_response = await cached_fetch(
+                    ('spot_market_summary', self.network.grpc_exchange_endpoint, market_id), SUMMARIES_TTL,
+                    lambda: self.client.fetch_spot_market_summary(market_id=market_id)
+                )
             
             if hasattr(summary_response, 'market_summary'):
                 summary = summary_response.market_summary
@@ -122,45 +241,48 @@ class MarketVolumeAnalyzer:
                 return {'volume': '0', 'volume_7d': '0', 'change_24h': '0'}
                 
         except Exception as e:
-            logger.debug(f"Could not get summary for {market_id}: {e}")
+            logger.debug("Could not get summary for %s: %s", market_id, e)
             return {'volume': '0', 'volume_7d': '0', 'change_24h': '0'}
     
     def get_top_volume_markets(self, markets: List[MarketInfo], count: int = 20) -> List[MarketInfo]:
-        """Get top markets by 24h volume"""
-        # Filter only active markets
-        active_markets = [m for m in markets if m.is_active]
-        
-        # Sort by 24h volume (descending)
-        sorted_markets = sorted(active_markets, key=lambda x: x.volume_24h, reverse=True)
+        """Get top active markets by 24h volume"""
+        if len(markets) < VECTORIZED_RANKING_MIN:
+            return heapq.nlargest(count, (m for m in markets if m.is_active), key=_by_volume)
         
-        return sorted_markets[:count]
+        # Partition the active volumes in NumPy, then order only the top count
+        ranked = np.fromiter(
+            ((m.volume_24h, m.is_active) for m in markets),
+            dtype=[('volume', 'f8'), ('active', '?')],
+            count=len(markets)
+        )
+        active = np.flatnonzero(ranked['active'])
+        volumes = -ranked['volume'][active]
+        count = min(max(count, 0), len(volumes))
+        if count == 0:
+            return []
+        top = np.argpartition(volumes, count - 1)[:count] if count < len(volumes) else np.arange(count)
+        top = top[np.argsort(volumes[top], kind='stable')]
+        return [markets[i] for i in active[top]]
     
     def get_most_volatile_markets(self, markets: List[MarketInfo], count: int = 10) -> List[MarketInfo]:
-        """Get most volatile markets by price change"""
-        active_markets = [m for m in markets if m.is_active]
-        
-        # Sort by absolute price change (most volatile)
-        sorted_markets = sorted(active_markets, key=lambda x: abs(x.price_change_24h), reverse=True)
-        
-        return sorted_markets[:count]
+        """Get most volatile active markets by absolute price change"""
+        return heapq.nlargest(count, (m for m in markets if m.is_active), key=lambda m: abs(m.price_change_24h))
     
     async def analyze_market_activity(self, market_id: str, duration: int = 30) -> Dict[str, Any]:
         """Analyze real-time activity for a specific market"""
-        logger.info(f"Analyzing activity for {market_id} for {duration} seconds...")
+        logger.info("Analyzing activity for %s for %s seconds...", market_id, duration)
         
-        message_count = 0
-        orderbook_updates = 0
-        trade_updates = 0
+        counts = ActivityCounts()
         
         def activity_callback(data):
-            nonlocal message_count, orderbook_updates, trade_updates
-            message_count += 1
+            counts.messages += 1
             
-            # Determine message type based on content
-            if 'orderbook' in str(data).lower():
-                orderbook_updates += 1
-            elif 'trade' in str(data).lower():
-                trade_updates += 1
+            # Determine message type from its top-level keys (or class name), not its full text
+            kind = _update_kind(tuple(data) if isinstance(data, dict) else (type(data).__name__,))
+            if kind == 'orderbook':
+                counts.orderbook += 1
+            elif kind == 'trade':
+                counts.trades += 1
         
         try:
             # Start monitoring
@@ -182,15 +304,15 @@ class MarketVolumeAnalyzer:
                 pass
             
             return {
-                'total_messages': message_count,
-                'orderbook_updates': orderbook_updates,
-                'trade_updates': trade_updates,
-                'messages_per_second': message_count / duration,
-                'activity_score': message_count / duration * 10  # Normalized score
+                'total_messages': counts.messages,
+                'orderbook_updates': counts.orderbook,
+                'trade_updates': counts.trades,
+                'messages_per_second': counts.messages / duration,
+                'activity_score': counts.messages / duration * 10  # Normalized score
             }
             
         except Exception as e:
-            logger.error(f"Error analyzing market activity: {e}")
+            logger.error("Error analyzing market activity: %s", e)
             return {
                 'total_messages': 0,
                 'orderbook_updates': 0,
@@ -201,34 +323,39 @@ class MarketVolumeAnalyzer:
 
 async def main():
     """Main analysis function"""
-    analyzer = MarketVolumeAnalyzer()
-    
+    async with MarketVolumeAnalyzer() as analyzer:
+        return await _report(analyzer)
+
+async def _report(analyzer: MarketVolumeAnalyzer) -> List[str]:
+    """Log the volume, volatility and activity rankings; return the top market IDs"""
     logger.info("🔍 Fetching all Injective spot markets...")
     all_markets = await analyzer.fetch_all_spot_markets()
     
-    logger.info(f"📊 Found {len(all_markets)} USD markets")
+    logger.info("📊 Found %d USD markets", len(all_markets))
     
     # Get top volume markets
     top_volume = analyzer.get_top_volume_markets(all_markets, 20)
     
     logger.info("\n🏆 TOP 20 MARKETS BY 24H VOLUME:")
     logger.info("=" * 80)
-    logger.info(f"{'Rank':<4} {'Ticker':<20} {'Market ID':<16} {'Volume 24h':<15} {'Change 24h':<10}")
+    logger.info("%-4s %-20s %-16s %-15s %-10s", 'Rank', 'Ticker', 'Market ID', 'Volume 24h', 'Change 24h')
     logger.info("-" * 80)
     
-    for i, market in enumerate(top_volume, 1):
-        logger.info(f"{i:<4} {market.ticker:<20} {market.market_id[:16]:<16} ${market.volume_24h:<14} {market.price_change_24h:>8.2f}%")
+    if logger.isEnabledFor(logging.INFO):
+        for i, market in enumerate(top_volume, 1):
+            logger.info("%-4d %-20s %-16.16s $%-14s %8.2f%%",
+                        i, market.ticker, market.market_id, f"{market.volume_24h:,.2f}", market.price_change_24h)
     
     # Get most volatile markets
     most_volatile = analyzer.get_most_volatile_markets(all_markets, 10)
     
     logger.info("\n🎢 TOP 10 MOST VOLATILE MARKETS:")
     logger.info("=" * 80)
-    logger.info(f"{'Rank':<4} {'Ticker':<20} {'Market ID':<16} {'Change 24h':<10}")
+    logger.info("%-4s %-20s %-16s %-10s", 'Rank', 'Ticker', 'Market ID', 'Change 24h')
     logger.info("-" * 80)
     
     for i, market in enumerate(most_volatile, 1):
-        logger.info(f"{i:<4} {market.ticker:<20} {market.market_id[:16]:<16} {market.price_change_24h:>8.2f}%")
+        logger.info("%-4d %-20s %-16.16s %8.2f%%", i, market.ticker, market.market_id, market.price_change_24h)
     
     # Analyze activity for top 5 markets
     logger.info("\n📈 ANALYZING REAL-TIME ACTIVITY FOR TOP 5 MARKETS:")
@@ -237,10 +364,10 @@ async def main():
     for i, market in enumerate(top_volume[:5], 1):
         activity = await analyzer.analyze_market_activity(market.market_id, 15)  # 15 seconds each
         
-        logger.info(f"{i}. {market.ticker}")
-        logger.info(f"   Messages/sec: {activity['messages_per_second']:.2f}")
-        logger.info(f"   Activity Score: {activity['activity_score']:.1f}")
-        logger.info(f"   Total Messages: {activity['total_messages']}")
+        logger.info("%d. %s", i, market.ticker)
+        logger.info("   Messages/sec: %.2f", activity['messages_per_second'])
+        logger.info("   Activity Score: %.1f", activity['activity_score'])
+        logger.info("   Total Messages: %d", activity['total_messages'])
         logger.info("")
     
     # Return top markets for use in performance tests
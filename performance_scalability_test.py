@@ -151,8 +151,8 @@ class MultiMarketPerformanceTester:
         """Get top volume markets for testing"""
         logger.info(f"🔍 Fetching top {count} volume markets...")
         
-        analyzer = MarketVolumeAnalyzer()
-        all_markets = await analyzer.fetch_all_spot_markets()
+        async with MarketVolumeAnalyzer() as analyzer:
+            all_markets = await analyzer.fetch_all_spot_markets()
         top_markets = analyzer.get_top_volume_markets(all_markets, count)
         
         market_ids = [market.market_id for market in top_markets]
@@ -32,6 +32,15 @@ class MessageType(str, Enum):
     MARKET_METADATA = "market_metadata"
     ERROR = "error"
     HEARTBEAT = "heartbeat"
+    
+    @property
+    def bit(self) -> int:
+        """Single-bit flag of this type, for compact type bitmasks"""
+        return _MESSAGE_TYPE_BITS[self]
+
+
+# Single-bit flag per message type, in declaration order
+_MESSAGE_TYPE_BITS: Dict[MessageType, int] = {mt: 1 << i for i, mt in enumerate(MessageType)}
 
 
 class ConnectionMetrics(BaseModel):
@@ -140,6 +149,14 @@ class RateLimitError(ConnectionError):
 class MessageHandler(ABC):
     """Abstract message handler interface"""
     
+    # Keep the interface slot-free so handlers may declare __slots__
+    __slots__ = ()
+    
+    # Handlers whose handling never awaits may set this and define a synchronous
+    # on_message(message), letting dispatchers call it directly instead of
+    # scheduling handle_message; without on_message, handle_message is used
+    on_message_sync: bool = False
+    
     @abstractmethod
     async def handle_message(self, message: WebSocketMessage) -> None:
         """Handle incoming WebSocket message"""
@@ -200,8 +217,14 @@ __all__ = [
 
 # Import network utilities for easier access
 try:
-    from .network_utils import NetworkConnectivityManager, NetworkAwareInjectiveClient
-    __all__.extend(["NetworkConnectivityManager", "NetworkAwareInjectiveClient"])
+    from .network_utils import (
+        NetworkConnectivityManager, NetworkAwareInjectiveClient, extract_markets, cached_fetch, close_client, specialize,
+        write_json
+    )
+    __all__.extend([
+        "NetworkConnectivityManager", "NetworkAwareInjectiveClient", "extract_markets", "cached_fetch", "close_client",
+        "specialize", "write_json"
+    ])
 except ImportError:
     # Network utilities are optional
     pass
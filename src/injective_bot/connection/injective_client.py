@@ -7,7 +7,7 @@ import asyncio
 import logging
 import json
 import time
-from typing import Optional, Dict, Any, List, Set, Callable
+from typing import Optional, Dict, Any, List, Set, Callable, Sequence, Tuple
 from datetime import datetime, timezone
 
 # Import injective-py instead of websockets
@@ -81,7 +81,13 @@ class CircuitBreaker:
 
 class InjectiveStreamClient(ConnectionManager):
     """Injective Protocol streaming client using injective-py"""
-    
+
+    # Spot stream kinds available to subscribe_multi: (subscription prefix, AsyncClient listener)
+    _SPOT_STREAMS: Dict[MessageType, Tuple[str, str]] = {
+        MessageType.ORDERBOOK: ("spot_orderbook", "listen_spot_orderbook_updates"),
+        MessageType.TRADES: ("spot_trades", "listen_spot_trades_updates"),
+    }
+
     def __init__(
         self,
         config: WebSocketConfig,
@@ -397,6 +403,94 @@ class InjectiveStreamClient(ConnectionManager):
         logger.info(f"Market IDs: {market_ids}")
         logger.info(f"Total active derivative subscriptions: {len([s for s in self._active_subscriptions if 'derivative' in s])}")
 
+    async def subscribe_multi(
+        self,
+        market_ids: List[str],
+        message_types: Sequence[MessageType] = (MessageType.ORDERBOOK, MessageType.TRADES)
+    ) -> None:
+        """Subscribe to several spot stream kinds for multiple markets in one call
+
+        Starts exactly one stream per message type carrying the full market list.
+        All streams feed the shared message queue, and each queued message is
+        tagged with the message type of the stream it arrived on.
+        """
+        if self._connection_state != ConnectionState.CONNECTED or not self._client:
+            raise ConnectionError("Not connected to Injective Protocol")
+
+        unsupported = [mt for mt in message_types if mt not in self._SPOT_STREAMS]
+        if unsupported:
+            raise ValueError(f"Unsupported stream message types: {unsupported}")
+
+        for message_type in dict.fromkeys(message_types):
+            stream_name, listener_name = self._SPOT_STREAMS[message_type]
+            listener = getattr(self._client, listener_name)
+
+            # Single subscription for all markets of this stream kind
+            task = asyncio.create_task(
+                listener(
+                    market_ids=market_ids,
+                    callback=self._make_stream_callback(message_type, stream_name)
+                )
+            )
+
+            subscription_id = f"{stream_name}_{'_'.join(market_ids[:2])}"  # Use first 2 IDs for ID
+            self._subscription_tasks[subscription_id] = task
+            self._active_subscriptions.add(subscription_id)
+
+        logger.info(
+            f"Subscribed to {[mt.value for mt in message_types]} streams for "
+            f"{len(market_ids)} markets using one subscription per stream kind"
+        )
+
+    async def unsubscribe_all(self) -> None:
+        """Cancel every active subscription while keeping the connection open
+
+        Lets one connected client run several subscription sets back to back
+        without a reconnect in between.
+        """
+        tasks = [task for task in self._subscription_tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+
+        if tasks:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*tasks, return_exceptions=True),
+                    timeout=2.0
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Some subscription tasks did not cancel within timeout")
+
+        self._active_subscriptions.clear()
+        self._subscription_tasks.clear()
+
+        logger.info(f"Cancelled {len(tasks)} subscriptions")
+
+    def _make_stream_callback(self, message_type: MessageType, stream_name: str) -> Callable[[Any], None]:
+        """Build a stream callback that enqueues messages tagged with message_type"""
+
+        def stream_callback(data):
+            """Unified callback for all markets of one stream kind"""
+            try:
+                ws_message = WebSocketMessage(
+                    message_id=f"inj_{int(time.time() * 1000)}",
+                    message_type=message_type,
+                    data=data,
+                    market_id=self._extract_market_id(data)
+                )
+
+                if not self._message_queue.full():
+                    self._message_queue.put_nowait(ws_message)
+                    self._metrics.total_messages_received += 1
+                    self._metrics.last_message_time = datetime.now(timezone.utc)
+                else:
+                    logger.warning("Message queue is full, dropping message")
+
+            except Exception as e:
+                logger.error(f"Error in {stream_name} callback: {e}")
+
+        return stream_callback
+
     async def _message_processor(self) -> None:
         """Process messages from the queue"""
         try:
@@ -458,9 +552,18 @@ class InjectiveStreamClient(ConnectionManager):
             logger.debug(f"No handlers registered for message type: {message.message_type}")
             return
 
-        # Dispatch to all handlers concurrently
+        # Dispatch to all handlers concurrently - synchronous handlers are called inline
         tasks = []
         for handler in handlers:
+            on_message = None
+            if getattr(handler, "on_message_sync", False) is True:
+                on_message = getattr(handler, "on_message", None)
+            if callable(on_message):
+                try:
+                    on_message(message)
+                except Exception as e:
+                    logger.debug(f"Synchronous handler error: {e}")
+                continue
             task = asyncio.create_task(handler.handle_message(message))
             tasks.append(task)
 
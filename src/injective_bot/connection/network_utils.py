@@ -4,13 +4,114 @@ Network utilities to handle connectivity issues, endpoint fallbacks, and robust
 """
 
 import asyncio
+import itertools
+import json
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Coroutine, Dict, Iterable, List, Optional, Tuple, TypeVar
 from pyinjective import AsyncClient
 from pyinjective.core.network import Network
 
+try:
+    import orjson
+except ImportError:  # orjson is optional - fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
 logger = logging.getLogger(__name__)
 
+# Dict keys that may carry the market list in a markets response, in lookup order
+_MARKETS_KEYS = ("markets", "market", "data", "result")
+
+_T = TypeVar("_T")
+
+
+def extract_markets(response: Any) -> List[Any]:
+    """
+    Extract the market list from an injective-py markets response
+
+    Handles protobuf responses exposing ``markets``, dict payloads keyed by
+    ``markets``/``market``/``data``/``result`` and bare lists.
+    Any other shape yields an empty list.
+    """
+    markets = getattr(response, "markets", None)
+    if markets is not None:
+        return markets
+    if isinstance(response, dict):
+        for key in _MARKETS_KEYS:
+            markets = response.get(key)
+            if markets:
+                return markets
+        return []
+    return response if isinstance(response, list) else []
+
+
+def specialize(items: Iterable[Any], from_dict: Callable, from_object: Callable) -> Tuple[Callable, Iterable[Any]]:
+    """
+    Pick the converter for a response list from its first item
+
+    A response list holds one item type, so the dict/object check runs once
+    instead of per item. Returns the converter and an iterable that still
+    yields the first item.
+    """
+    items = iter(items)
+    first = next(items, None)
+    if first is None:
+        return from_object, ()
+    return (from_dict if isinstance(first, dict) else from_object), itertools.chain((first,), items)
+
+
+def write_json(path: str, payload: Any) -> None:
+    """Write payload as indented JSON, using orjson when it is installed"""
+    if orjson is not None:
+        Path(path).write_bytes(orjson.dumps(payload, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, 'w') as f:
+            json.dump(payload, f, indent=2)
+
+
+def run(main: Coroutine[Any, Any, _T]) -> _T:
+    """Run a script's main coroutine to completion on uvloop when it is installed, else the default asyncio loop"""
+    with asyncio.Runner(loop_factory=uvloop.new_event_loop if uvloop else None) as runner:
+        return runner.run(main)
+
+
+# Seconds a cached response is reused: market metadata rarely changes, summaries move constantly
+MARKETS_TTL = 24 * 60 * 60
+SUMMARIES_TTL = 60
+
+# Responses by request key, as (fetched at, response)
+_response_cache: Dict[Tuple, Tuple[float, Any]] = {}
+
+
+async def cached_fetch(key: Tuple, ttl: float, fetch: Callable[[], Awaitable[Any]]) -> Any:
+    """
+    Return the response cached under key if younger than ttl seconds, else await fetch() and cache it
+
+    Keys should name the request and the endpoint it went to. Failed
+    fetches raise and are not cached.
+    """
+    entry = _response_cache.get(key)
+    if entry is not None and time.monotonic() - entry[0] < ttl:
+        return entry[1]
+    response = await fetch()
+    _response_cache[key] = (time.monotonic(), response)
+    return response
+
+
+async def close_client(client: AsyncClient) -> None:
+    """Close the exchange and chain gRPC channels of an AsyncClient, logging any failure"""
+    for close in (client.close_exchange_channel, client.close_chain_channel):
+        try:
+            await close()
+        except Exception as e:
+            logger.debug("Error closing client channel: %s", e)
+
 
 class NetworkConnectivityManager:
     """Manages network connectivity with fallback strategies"""
@@ -185,6 +286,14 @@ class NetworkAwareInjectiveClient:
 
 
 __all__ = [
+    "extract_markets",
+    "specialize",
+    "write_json",
+    "run",
+    "MARKETS_TTL",
+    "SUMMARIES_TTL",
+    "cached_fetch",
+    "close_client",
     "NetworkConnectivityManager",
     "NetworkAwareInjectiveClient"
 ]
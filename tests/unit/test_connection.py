@@ -19,6 +19,10 @@ from injective_bot.connection import (
     MessageHandler, ConnectionManager
 )
 from injective_bot.connection.injective_client import CircuitBreaker, InjectiveStreamClient
+from injective_bot.connection import network_utils
+from injective_bot.connection.network_utils import (
+    cached_fetch, close_client, extract_markets, run, specialize, write_json
+)
 from injective_bot.config import WebSocketConfig
 
 # Set up logger for tests
@@ -51,6 +55,12 @@ class TestMessageType:
         assert MessageType.ERROR == "error"
         assert MessageType.HEARTBEAT == "heartbeat"
 
+    def test_message_type_bits(self):
+        """Test each MessageType carries a distinct single-bit flag"""
+        bits = [mt.bit for mt in MessageType]
+        assert all(bit and bit & (bit - 1) == 0 for bit in bits)
+        assert len(set(bits)) == len(bits)
+
 
 class TestConnectionMetrics:
     """Test ConnectionMetrics data class"""
@@ -256,6 +266,16 @@ class MockMessageHandler(MessageHandler):
         return self.supported_types
 
 
+class MockSyncMessageHandler(MockMessageHandler):
+    """Mock message handler using the synchronous dispatch fast path"""
+    
+    on_message_sync = True
+    
+    def on_message(self, message: WebSocketMessage) -> None:
+        """Handle incoming message synchronously"""
+        self.received_messages.append(message)
+
+
 class TestInjectiveStreamClient:
     """Test InjectiveStreamClient"""
     
@@ -410,6 +430,66 @@ class TestInjectiveStreamClient:
         call_args = mock_client.listen_derivative_orderbook_updates.call_args
         assert call_args[1]['market_ids'] == market_ids
 
+    @pytest.mark.asyncio
+    async def test_multi_subscription_single_stream_per_type(self, manager):
+        """Test subscribe_multi opens one stream per type and tags queued messages"""
+        mock_client = Mock()
+        mock_client.listen_spot_orderbook_updates = AsyncMock()
+        mock_client.listen_spot_trades_updates = AsyncMock()
+        manager._client = mock_client
+        manager._connection_state = ConnectionState.CONNECTED
+
+        market_ids = ["BTC-USDT", "ETH-USDT"]
+        await manager.subscribe_multi(market_ids)
+        await asyncio.sleep(0)
+
+        # One stream per message type, each carrying every market
+        mock_client.listen_spot_orderbook_updates.assert_called_once()
+        mock_client.listen_spot_trades_updates.assert_called_once()
+        assert mock_client.listen_spot_orderbook_updates.call_args[1]['market_ids'] == market_ids
+        assert mock_client.listen_spot_trades_updates.call_args[1]['market_ids'] == market_ids
+        assert len(manager._subscription_tasks) == 2
+
+        # Callbacks tag messages with the stream's message type
+        trades_callback = mock_client.listen_spot_trades_updates.call_args[1]['callback']
+        trades_callback({"market_id": "BTC-USDT", "price": "45000"})
+        message = manager._message_queue.get_nowait()
+        assert message.message_type == MessageType.TRADES
+        assert message.market_id == "BTC-USDT"
+
+        await manager.disconnect()
+
+    @pytest.mark.asyncio
+    async def test_unsubscribe_all_keeps_connection(self, manager):
+        """Test unsubscribe_all cancels streams but leaves the client connected"""
+        async def listen_forever(**kwargs):
+            await asyncio.sleep(3600)
+
+        mock_client = Mock()
+        mock_client.listen_spot_orderbook_updates = AsyncMock(side_effect=listen_forever)
+        manager._client = mock_client
+        manager._connection_state = ConnectionState.CONNECTED
+
+        await manager.subscribe_spot_orderbook_updates(["BTC-USDT"])
+        await asyncio.sleep(0)
+        task = next(iter(manager._subscription_tasks.values()))
+
+        await manager.unsubscribe_all()
+
+        assert task.cancelled()
+        assert len(manager._subscription_tasks) == 0
+        assert len(manager._active_subscriptions) == 0
+        assert manager.get_connection_state() == ConnectionState.CONNECTED
+
+    @pytest.mark.asyncio
+    async def test_multi_subscription_unsupported_type(self, manager):
+        """Test subscribe_multi rejects stream kinds it cannot open"""
+        manager._client = Mock()
+        manager._connection_state = ConnectionState.CONNECTED
+
+        with pytest.raises(ValueError):
+            await manager.subscribe_multi(["BTC-USDT"], [MessageType.ACCOUNT])
+
     @pytest.mark.asyncio
     async def test_subscription_without_connection(self, manager):
         """Test subscription fails when not connected"""
@@ -466,6 +546,33 @@ class TestInjectiveStreamClient:
         assert message.message_type == MessageType.ORDERBOOK
         assert "BTC-USDT" in str(message.data)
 
+    @pytest.mark.asyncio
+    async def test_dispatch_sync_handler_fast_path(self, manager):
+        """Test synchronous handlers are called inline, not via handle_message"""
+        sync_handler = MockSyncMessageHandler([MessageType.ORDERBOOK])
+        async_handler = MockMessageHandler([MessageType.ORDERBOOK])
+        manager.register_handler(sync_handler)
+        manager.register_handler(async_handler)
+        
+        message = WebSocketMessage(message_id="msg_1", message_type=MessageType.ORDERBOOK)
+        await manager._dispatch_message(message)
+        
+        assert sync_handler.received_messages == [message]
+        sync_handler.handle_message_mock.assert_not_called()
+        assert async_handler.received_messages == [message]
+
+    @pytest.mark.asyncio
+    async def test_sync_flag_without_on_message_uses_handle_message(self, manager):
+        """Test handlers flagged synchronous but lacking on_message still get messages"""
+        handler = MockMessageHandler([MessageType.ORDERBOOK])
+        handler.on_message_sync = True
+        manager.register_handler(handler)
+        
+        message = WebSocketMessage(message_id="msg_1", message_type=MessageType.ORDERBOOK)
+        await manager._dispatch_message(message)
+        
+        assert handler.received_messages == [message]
+
     def test_rate_limiting(self, manager):
         """Test message rate limiting"""
         # Fill up rate limit with recent timestamps
@@ -997,3 +1104,108 @@ class TestErrorRecoveryScenarios:
         await client.disconnect()
         
         assert client._connection_state == ConnectionState.DISCONNECTED
+
+
+class TestExtractMarkets:
+    """Test markets response shape extraction"""
+
+    def test_attribute_response(self):
+        """Test responses exposing a markets attribute"""
+        response = Mock()
+        response.markets = ["m1", "m2"]
+        assert extract_markets(response) == ["m1", "m2"]
+
+    def test_dict_response_keys(self):
+        """Test dict payloads keyed by any supported key"""
+        assert extract_markets({"markets": ["m1"]}) == ["m1"]
+        assert extract_markets({"market": ["m2"]}) == ["m2"]
+        assert extract_markets({"data": ["m3"]}) == ["m3"]
+        assert extract_markets({"result": ["m4"]}) == ["m4"]
+        assert extract_markets({"other": ["m5"]}) == []
+
+    def test_list_and_unknown_responses(self):
+        """Test bare lists pass through and unknown shapes yield no markets"""
+        assert extract_markets(["m1"]) == ["m1"]
+        assert extract_markets("not markets") == []
+        assert extract_markets(None) == []
+
+    def test_specialize_picks_converter_from_first_item(self):
+        """Test the converter follows the first item and that item is kept"""
+        convert, items = specialize([{"id": 1}, {"id": 2}], dict, list)
+        assert convert is dict
+        assert list(items) == [{"id": 1}, {"id": 2}]
+
+        convert, items = specialize(iter([Mock()]), dict, list)
+        assert convert is list
+        assert len(list(items)) == 1
+
+        convert, items = specialize([], dict, list)
+        assert convert is list
+        assert list(items) == []
+
+
+class TestCachedFetch:
+    """Test TTL-cached responses and client teardown helpers"""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        """Start and end each test with an empty response cache"""
+        network_utils._response_cache.clear()
+        yield
+        network_utils._response_cache.clear()
+
+    @pytest.mark.asyncio
+    async def test_reuses_response_within_ttl(self):
+        """Test a fresh response is served from cache"""
+        fetch = AsyncMock(return_value={"markets": []})
+        assert await cached_fetch(("markets", "host"), 60, fetch) == {"markets": []}
+        assert await cached_fetch(("markets", "host"), 60, fetch) == {"markets": []}
+        fetch.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_refetches_expired_or_failed_responses(self):
+        """Test expired entries are refetched and failures are not cached"""
+        fetch = AsyncMock(side_effect=[RuntimeError("down"), "first", "second"])
+        with pytest.raises(RuntimeError):
+            await cached_fetch(("markets", "host"), 60, fetch)
+        assert await cached_fetch(("markets", "host"), 0, fetch) == "first"
+        assert await cached_fetch(("markets", "host"), 0, fetch) == "second"
+
+    @pytest.mark.asyncio
+    async def test_close_client_closes_both_channels(self):
+        """Test both gRPC channels are closed even when the first close fails"""
+        client = Mock()
+        client.close_exchange_channel = AsyncMock()
+        client.close_chain_channel = AsyncMock()
+        await close_client(client)
+        client.close_exchange_channel.assert_awaited_once()
+        client.close_chain_channel.assert_awaited_once()
+
+        client.close_exchange_channel = AsyncMock(side_effect=RuntimeError("closed"))
+        client.close_chain_channel = AsyncMock()
+        await close_client(client)
+        client.close_chain_channel.assert_awaited_once()
+
+
+class TestWriteJson:
+    """Test the shared JSON report writer"""
+
+    def test_writes_indented_json(self, tmp_path):
+        """Test the payload round-trips with two-space indentation"""
+        path = tmp_path / "report.json"
+        write_json(str(path), {"markets": [1, 2], "success": True})
+        text = path.read_text()
+        assert json.loads(text) == {"markets": [1, 2], "success": True}
+        assert '\n  "markets"' in text
+
+
+class TestRun:
+    """Test the script entry-point runner"""
+
+    def test_returns_coroutine_result(self):
+        """Test the main coroutine runs to completion and its result is returned"""
+        async def main():
+            await asyncio.sleep(0)
+            return 42
+
+        assert run(main()) == 42